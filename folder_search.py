@@ -0,0 +1,107 @@
+import multiprocessing
+import os
+import queue
+import re
+import threading
+
+from regex_worker import compile_pattern
+
+# Длина фрагмента строки в результатах и предел совпадений на файл
+SNIPPET_CHARS = 120
+MAX_FILE_HITS = 1000
+# Как часто сборщик результатов проверяет отмену, секунды
+COLLECT_TIMEOUT = 0.1
+
+
+def markdown_files(directory):
+    """Все .md файлы папки и её подпапок, кроме скрытых"""
+    result = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [name for name in dirs if not name.startswith(".")]
+        result.extend(
+            os.path.join(root, name) for name in files if name.endswith(".md")
+        )
+    result.sort()
+    return result
+
+
+def search_file(path, pattern, flags):
+    """Совпадения регулярного выражения в файле: [(номер строки, фрагмент)]
+
+    Выполняется в дочернем процессе. Номера строк считаются одним проходом:
+    переводы строк между соседними совпадениями считаются один раз.
+    """
+    compiled = compile_pattern(pattern, flags)
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read()
+
+    hits = []
+    line = 1
+    pos = 0
+    for match in compiled.finditer(text):
+        start = match.start()
+        line += text.count("\n", pos, start)
+        pos = start
+        line_start = text.rfind("\n", 0, start) + 1
+        line_end = text.find("\n", start)
+        if line_end == -1:
+            line_end = len(text)
+        # Длинную строку показываем с места совпадения
+        if line_end - line_start > SNIPPET_CHARS:
+            line_start = max(line_start, start - SNIPPET_CHARS // 4)
+        hits.append((line, text[line_start:line_end][:SNIPPET_CHARS]))
+        if len(hits) >= MAX_FILE_HITS:
+            break
+    return hits
+
+
+def _search_entry(job):
+    """search_file для пула: ошибка файла — пустой результат, а не исключение"""
+    path, pattern, flags = job
+    try:
+        return path, search_file(path, pattern, flags)
+    except (OSError, re.error):
+        return path, []
+
+
+class FolderSearch:
+    """Поиск регулярного выражения по файлам в пуле процессов
+
+    Каждый файл — отдельная задача, поэтому поиск масштабируется по ядрам.
+    Результаты по мере готовности попадают в очередь results парами
+    (путь, совпадения); None в очереди означает конец поиска. Отмена
+    убивает процессы пула: файл с бесконечным перебором не держит ядра.
+    """
+
+    def __init__(self, paths, pattern, flags=re.IGNORECASE):
+        self.results = queue.Queue()
+        self.total = len(paths)
+        self.done = 0
+        self._cancelled = threading.Event()
+        # spawn: дочерние процессы не наследуют потоки и состояние Tk
+        self._pool = multiprocessing.get_context("spawn").Pool()
+        self._hits = self._pool.imap_unordered(
+            _search_entry, [(path, pattern, flags) for path in paths]
+        )
+        threading.Thread(target=self._collect, daemon=True).start()
+
+    def _collect(self):
+        try:
+            while not self._cancelled.is_set():
+                try:
+                    path, hits = self._hits.next(timeout=COLLECT_TIMEOUT)
+                except multiprocessing.TimeoutError:
+                    continue
+                except StopIteration:
+                    break
+                self.done += 1
+                if hits:
+                    self.results.put((path, hits))
+        finally:
+            self._pool.terminate()
+            self.results.put(None)
+
+    def cancel(self):
+        """Прекращает выдачу и убивает процессы пула, даже занятые файлом"""
+        self._cancelled.set()
+        self._pool.terminate()
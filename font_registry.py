@@ -0,0 +1,63 @@
+from tkinter import font
+
+# Шрифты тегов: (прибавка к базовому размеру, weight, slant)
+TAG_FONTS = {
+    "info": (1, "bold", "italic"),
+    "tag": (1, "bold", "italic"),
+    "h1": (6, "bold", "roman"),
+    "h2": (4, "bold", "roman"),
+    "h3": (2, "bold", "roman"),
+    "h4": (0, "bold", "roman"),
+    "h5": (-1, "bold", "roman"),
+    "bold": (0, "bold", "roman"),
+    "italic": (0, "normal", "italic"),
+    "bold_italic": (0, "bold", "italic"),
+    "link": (0, "normal", "roman"),
+    "list": (0, "normal", "roman"),
+}
+
+
+class FontRegistry:
+    """Общие для всех панелей шрифты, производные от базового размера"""
+
+    _shared = None
+
+    @classmethod
+    def shared(cls, widget):
+        if cls._shared is None:
+            cls._shared = cls(widget._root())
+        return cls._shared
+
+    def __init__(self, root, family="Monospace", size=10):
+        self.base_font = font.Font(root=root, family=family, size=size)
+        self.family = self.base_font.actual("family")
+        self.code_font = font.Font(root=root, family="Courier", size=size)
+
+        # Одинаковые описания используют один объект Font
+        self._fonts = {}
+        self._tag_fonts = {}
+        for tag, spec in TAG_FONTS.items():
+            if spec not in self._fonts:
+                delta, weight, slant = spec
+                self._fonts[spec] = font.Font(
+                    root=root,
+                    family=self.family,
+                    size=size + delta,
+                    weight=weight,
+                    slant=slant,
+                )
+            self._tag_fonts[tag] = self._fonts[spec]
+
+    def tag_font(self, tag):
+        return self._tag_fonts[tag]
+
+    @property
+    def size(self):
+        return self.base_font.actual("size")
+
+    def set_size(self, size):
+        """Меняет размер всех шрифтов разом: перевёрстка пройдёт один раз в idle"""
+        self.base_font.configure(size=size)
+        self.code_font.configure(size=size)
+        for (delta, _, _), tag_font in self._fonts.items():
+            tag_font.configure(size=size + delta)
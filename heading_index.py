@@ -0,0 +1,105 @@
+from bisect import bisect_left, bisect_right
+
+from line_ranges import LineRanges
+
+
+def parse_heading(line):
+    """Уровень и название заголовка строки или None"""
+    if line.startswith("# "):
+        return 1, line[2:]
+    if line.startswith("#####"):
+        return 5, line[6:]
+    if line.startswith("####"):
+        return 4, line[5:]
+    if line.startswith("###"):
+        return 3, line[4:]
+    if line.startswith("##"):
+        return 2, line[3:]
+    return None
+
+
+class HeadingIndex:
+    """Заголовки документа, обновляемые по уведомлениям о правках
+
+    lines — отсортированные номера строк заголовков, entries — их уровни и
+    названия. Правка сразу сдвигает номера строк и помечает изменённые
+    строки грязными; refresh() перечитывает только грязные строки.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.entries = {}
+        self.dirty = LineRanges()
+        self.built = False
+
+    def __len__(self):
+        return len(self.lines)
+
+    def entry_at(self, row):
+        line = self.lines[row]
+        return line, self.entries[line]
+
+    def rebuild(self, lines):
+        self.lines = []
+        self.entries = {}
+        for i, text in enumerate(lines, 1):
+            heading = parse_heading(text)
+            if heading:
+                self.lines.append(i)
+                self.entries[i] = heading
+        self.dirty.clear()
+        self.built = True
+
+    def on_edit(self, first, removed, added):
+        """Строки first..first+removed заменены строками first..first+added
+
+        Возвращает диапазон позиций [lo, hi) заголовков, строки которых
+        исчезли вместе с правкой.
+        """
+        lo = bisect_right(self.lines, first)
+        hi = bisect_right(self.lines, first + removed)
+        for line in self.lines[lo:hi]:
+            del self.entries[line]
+        del self.lines[lo:hi]
+
+        delta = added - removed
+        if delta:
+            moved = [(line, self.entries.pop(line)) for line in self.lines[lo:]]
+            for line, heading in moved:
+                self.entries[line + delta] = heading
+            self.lines[lo:] = [line + delta for line in self.lines[lo:]]
+
+        self.dirty.shift(first, delta)
+        self.dirty.add(first, first + added)
+        return lo, hi
+
+    def is_dirty_everywhere(self, line_count):
+        return not self.dirty.missing(1, line_count)
+
+    def refresh(self, get_lines):
+        """Перечитывает грязные строки и возвращает изменения по порядку
+
+        Каждое изменение — (op, row, heading), где op — "insert", "delete"
+        или "update", а row — позиция заголовка на момент изменения.
+        """
+        changes = []
+        for first, last in list(self.dirty):
+            for line, text in enumerate(get_lines(first, last), first):
+                heading = parse_heading(text)
+                old = self.entries.get(line)
+                if heading == old:
+                    continue
+                row = bisect_left(self.lines, line)
+                if old is None:
+                    self.lines.insert(row, line)
+                    self.entries[line] = heading
+                    changes.append(("insert", row, heading))
+                elif heading is None:
+                    del self.lines[row]
+                    del self.entries[line]
+                    changes.append(("delete", row, None))
+                else:
+                    self.entries[line] = heading
+                    changes.append(("update", row, heading))
+        self.dirty.clear()
+        return changes
@@ -0,0 +1,190 @@
+import hashlib
+import os
+import sqlite3
+
+# Файл индекса в корне библиотеки
+INDEX_FILE_NAME = ".paraline-index.sqlite3"
+# Расширения файлов, которые попадают в индекс
+INDEXED_SUFFIXES = (".en.md", ".ru.md")
+# rowid строки в полнотекстовой таблице: (id файла << LINE_BITS) | номер строки
+LINE_BITS = 24
+# Сколько строк вставлять в индекс одним executemany
+INSERT_CHUNK = 5000
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fts_query(text):
+    """Строка поиска в запрос FTS5: каждое слово — отдельная фраза (И)"""
+    words = text.split()
+    return " ".join('"' + word.replace('"', '""') + '"' for word in words)
+
+
+class LibraryIndex:
+    """Полнотекстовый индекс всех пар *.en.md / *.ru.md в папке библиотеки
+
+    Строки файлов лежат в таблице SQLite FTS5, поэтому поиск — это обход
+    инвертированного индекса, а не сканирование текста. rowid строки
+    кодирует файл и номер строки, так что строки файла удаляются одним
+    диапазоном rowid. Файл переиндексируется, только если изменились его
+    mtime или размер и при этом изменилось содержимое (sha1).
+
+    Соединение SQLite привязано к потоку: для фоновой индексации нужен
+    отдельный объект LibraryIndex.
+    """
+
+    def __init__(self, library_dir):
+        self.library_dir = library_dir
+        self.path = os.path.join(library_dir, INDEX_FILE_NAME)
+        self.connection = sqlite3.connect(self.path)
+        # WAL: поиск читает индекс, пока фоновый поток его обновляет
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                hash TEXT NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS lines USING fts5(
+                text, tokenize = 'unicode61 remove_diacritics 2'
+            );
+            """
+        )
+
+    def close(self):
+        self.connection.close()
+
+    def library_files(self):
+        """Относительные пути всех индексируемых файлов библиотеки"""
+        result = []
+        for root, dirs, files in os.walk(self.library_dir):
+            dirs[:] = [name for name in dirs if not name.startswith(".")]
+            for name in files:
+                if name.endswith(INDEXED_SUFFIXES):
+                    path = os.path.join(root, name)
+                    result.append(os.path.relpath(path, self.library_dir))
+        result.sort()
+        return result
+
+    def update(self, progress=None, cancelled=None):
+        """Приводит индекс в соответствие с файлами на диске
+
+        progress(done, total, path) вызывается после каждого файла,
+        cancelled() позволяет прервать обновление между файлами.
+        Возвращает число переиндексированных файлов.
+        """
+        known = {
+            path: (file_id, mtime, size, digest)
+            for file_id, path, mtime, size, digest in self.connection.execute(
+                "SELECT id, path, mtime, size, hash FROM files"
+            )
+        }
+        paths = self.library_files()
+
+        # Файлы, удалённые с диска
+        for path in set(known) - set(paths):
+            file_id = known[path][0]
+            with self.connection:
+                self._delete_lines(file_id)
+                self.connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+        reindexed = 0
+        for done, path in enumerate(paths, 1):
+            if cancelled and cancelled():
+                break
+            full_path = os.path.join(self.library_dir, path)
+            try:
+                stat = os.stat(full_path)
+            except OSError:
+                continue
+
+            entry = known.get(path)
+            if entry and entry[1] == stat.st_mtime and entry[2] == stat.st_size:
+                if progress:
+                    progress(done, len(paths), path)
+                continue
+
+            digest = _file_hash(full_path)
+            with self.connection:
+                if entry and entry[3] == digest:
+                    # Файл «тронут», но не изменён: обновляем только mtime
+                    self.connection.execute(
+                        "UPDATE files SET mtime = ?, size = ? WHERE id = ?",
+                        (stat.st_mtime, stat.st_size, entry[0]),
+                    )
+                else:
+                    self._index_file(path, full_path, entry, stat, digest)
+                    reindexed += 1
+            if progress:
+                progress(done, len(paths), path)
+        return reindexed
+
+    def _index_file(self, path, full_path, entry, stat, digest):
+        if entry:
+            file_id = entry[0]
+            self._delete_lines(file_id)
+            self.connection.execute(
+                "UPDATE files SET mtime = ?, size = ?, hash = ? WHERE id = ?",
+                (stat.st_mtime, stat.st_size, digest, file_id),
+            )
+        else:
+            file_id = self.connection.execute(
+                "INSERT INTO files (path, mtime, size, hash) VALUES (?, ?, ?, ?)",
+                (path, stat.st_mtime, stat.st_size, digest),
+            ).lastrowid
+
+        with open(full_path, "r", encoding="utf-8", errors="replace") as f:
+            lines = f.read().split("\n")
+        base = file_id << LINE_BITS
+        rows = [
+            (base | number, line)
+            for number, line in enumerate(lines, 1)
+            if line.strip()
+        ]
+        for i in range(0, len(rows), INSERT_CHUNK):
+            self.connection.executemany(
+                "INSERT INTO lines (rowid, text) VALUES (?, ?)",
+                rows[i : i + INSERT_CHUNK],
+            )
+
+    def _delete_lines(self, file_id):
+        base = file_id << LINE_BITS
+        self.connection.execute(
+            "DELETE FROM lines WHERE rowid BETWEEN ? AND ?",
+            (base, base | ((1 << LINE_BITS) - 1)),
+        )
+
+    def search(self, text, limit=500):
+        """Строки библиотеки со всеми словами запроса, лучшие первыми
+
+        Возвращает список (полный путь, номер строки, фрагмент строки).
+        """
+        query = fts_query(text)
+        if not query:
+            return []
+        rows = self.connection.execute(
+            """
+            SELECT rowid, snippet(lines, 0, '[', ']', '…', 16)
+            FROM lines WHERE lines MATCH ? ORDER BY rank LIMIT ?
+            """,
+            (query, limit),
+        ).fetchall()
+
+        paths = dict(self.connection.execute("SELECT id, path FROM files"))
+        results = []
+        for rowid, snippet in rows:
+            path = paths.get(rowid >> LINE_BITS)
+            if path is None:
+                continue
+            line = rowid & ((1 << LINE_BITS) - 1)
+            results.append((os.path.join(self.library_dir, path), line, snippet))
+        return results
@@ -0,0 +1,269 @@
+import os
+import queue
+import re
+import sqlite3
+import threading
+import tkinter as tk
+from tkinter import filedialog
+
+from dialog_manager import DialogManager
+from folder_search import FolderSearch, markdown_files
+from library_index import INDEXED_SUFFIXES, LibraryIndex
+from regex_worker import compile_pattern
+
+# Опрос фоновой индексации и поиска по папке
+INDEX_POLL_MS = 100
+FOLDER_SEARCH_POLL_MS = 50
+
+
+class LibrarySearchDialog:
+    """Поиск по всем парам книг папки через полнотекстовый индекс
+
+    Индекс обновляется в фоновом потоке при открытии окна; искать можно
+    сразу, по уже проиндексированным файлам. Запросы, которые индекс не
+    понимает (регулярные выражения), выполняются перебором всех .md файлов
+    папки в пуле процессов. Выбор результата открывает пару книг через
+    open_result(путь, номер строки).
+    """
+
+    def __init__(self, root, library_dir, open_result):
+        self.open_result = open_result
+        self.library_dir = None
+        self.index = None
+        self.results = []
+        self._progress = queue.Queue()
+        self._cancel = threading.Event()
+        self.folder_search = None
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Поиск по библиотеке")
+        self.window.geometry("800x500")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        top = tk.Frame(self.window)
+        top.pack(side=tk.TOP, fill=tk.X, padx=5, pady=5)
+        tk.Button(
+            top, text="📂", command=self.choose_library, font=("Noto Color Emoji", 10)
+        ).pack(side=tk.LEFT, padx=2)
+        self.query_entry = tk.Entry(top)
+        self.query_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.query_entry.focus_set()
+        self.regex_var = tk.BooleanVar()
+        tk.Checkbutton(top, text="RegEx", variable=self.regex_var).pack(
+            side=tk.LEFT, padx=2
+        )
+        tk.Button(
+            top, text="🔎", command=self.search, font=("Noto Color Emoji", 10)
+        ).pack(side=tk.LEFT, padx=2)
+        self.cancel_button = tk.Button(
+            top,
+            text="⏹",
+            command=self.cancel_folder_search,
+            state=tk.DISABLED,
+            font=("Noto Color Emoji", 10),
+        )
+        self.cancel_button.pack(side=tk.LEFT, padx=2)
+
+        self.status_label = tk.Label(self.window, anchor="w")
+        self.status_label.pack(side=tk.TOP, fill=tk.X, padx=5)
+
+        list_frame = tk.Frame(self.window)
+        list_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.result_list = tk.Listbox(list_frame, activestyle="none")
+        scroll = tk.Scrollbar(list_frame, command=self.result_list.yview)
+        self.result_list.configure(yscrollcommand=scroll.set)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.result_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.query_entry.bind("<Return>", lambda e: self.search())
+        self.result_list.bind("<Double-Button-1>", lambda e: self.open_selected())
+        self.result_list.bind("<Return>", lambda e: self.open_selected())
+        self.window.bind("<Escape>", lambda e: self.close())
+
+        if library_dir:
+            self.set_library(library_dir)
+        else:
+            self.status_label.config(text="Выберите папку библиотеки")
+
+    def choose_library(self):
+        path = filedialog.askdirectory(
+            parent=self.window, title="Папка библиотеки", initialdir=self.library_dir
+        )
+        if path:
+            self.set_library(path)
+
+    def set_library(self, library_dir):
+        self.stop_indexing()
+        if self.index:
+            self.index.close()
+        self.library_dir = library_dir
+        try:
+            self.index = LibraryIndex(library_dir)
+        except sqlite3.Error as e:
+            self.index = None
+            DialogManager.show_dialog("Ошибка индекса", str(e))
+            return
+        self.start_indexing()
+
+    def start_indexing(self):
+        """Обновляет индекс в фоновом потоке со своим соединением SQLite"""
+        cancel = self._cancel = threading.Event()
+        progress = self._progress = queue.Queue()
+        library_dir = self.library_dir
+
+        def work():
+            try:
+                index = LibraryIndex(library_dir)
+                try:
+                    index.update(
+                        progress=lambda done, total, path: progress.put((done, total)),
+                        cancelled=cancel.is_set,
+                    )
+                finally:
+                    index.close()
+            except (OSError, sqlite3.Error) as e:
+                progress.put(e)
+            progress.put(None)
+
+        threading.Thread(target=work, daemon=True).start()
+        self.status_label.config(text=f"{library_dir}: индексация…")
+        self.window.after(INDEX_POLL_MS, self._poll_indexing, progress)
+
+    def _poll_indexing(self, progress):
+        if progress is not self._progress:
+            return
+        last = None
+        try:
+            while True:
+                state = progress.get_nowait()
+                if state is None:
+                    self.status_label.config(
+                        text=f"{self.library_dir}: индекс обновлён"
+                    )
+                    return
+                if isinstance(state, Exception):
+                    self.status_label.config(text=f"Ошибка индексации: {state}")
+                    return
+                last = state
+        except queue.Empty:
+            pass
+
+        if last:
+            done, total = last
+            self.status_label.config(
+                text=f"{self.library_dir}: индексация {done}/{total}"
+            )
+        self.window.after(INDEX_POLL_MS, self._poll_indexing, progress)
+
+    def stop_indexing(self):
+        self._cancel.set()
+        self._progress = None
+
+    def search(self):
+        if not self.library_dir:
+            return
+        if self.regex_var.get():
+            self.start_folder_search()
+            return
+        if not self.index:
+            return
+        try:
+            results = self.index.search(self.query_entry.get())
+        except sqlite3.Error as e:
+            DialogManager.show_dialog("Ошибка поиска", str(e))
+            return
+
+        self.cancel_folder_search()
+        self.results = []
+        self.result_list.delete(0, tk.END)
+        self.add_results(results)
+
+    def add_results(self, results):
+        """Дописывает результаты в список одним вызовом insert"""
+        if not results:
+            return
+        first = not self.results
+        self.results.extend(results)
+        self.result_list.insert(
+            tk.END,
+            *(
+                f"{os.path.relpath(path, self.library_dir)}:{line}  {snippet}"
+                for path, line, snippet in results
+            ),
+        )
+        if first:
+            self.result_list.selection_set(0)
+            self.result_list.activate(0)
+
+    def start_folder_search(self):
+        """Ищет регулярное выражение во всех .md файлах папки"""
+        pattern = self.query_entry.get()
+        if not pattern:
+            return
+        try:
+            compile_pattern(pattern, re.IGNORECASE)
+        except re.error as e:
+            DialogManager.show_dialog("Ошибка RegEx", str(e))
+            return
+
+        self.cancel_folder_search()
+        self.results = []
+        self.result_list.delete(0, tk.END)
+        # Только файлы пар книг: другой .md открыть парой нельзя
+        paths = [
+            path
+            for path in markdown_files(self.library_dir)
+            if path.endswith(INDEXED_SUFFIXES)
+        ]
+        search = self.folder_search = FolderSearch(paths, pattern, re.IGNORECASE)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status_label.config(text=f"Поиск: 0/{search.total}")
+        self.window.after(FOLDER_SEARCH_POLL_MS, self._poll_folder_search, search)
+
+    def _poll_folder_search(self, search):
+        if search is not self.folder_search:
+            return
+        results = []
+        finished = False
+        try:
+            while True:
+                item = search.results.get_nowait()
+                if item is None:
+                    finished = True
+                    break
+                path, hits = item
+                results.extend((path, line, snippet) for line, snippet in hits)
+        except queue.Empty:
+            pass
+
+        self.add_results(results)
+        text = f"Поиск: {search.done}/{search.total}, совпадений: {len(self.results)}"
+        if finished:
+            self.folder_search = None
+            self.cancel_button.config(state=tk.DISABLED)
+            self.status_label.config(text=text + " — готово")
+            return
+        self.status_label.config(text=text)
+        self.window.after(FOLDER_SEARCH_POLL_MS, self._poll_folder_search, search)
+
+    def cancel_folder_search(self):
+        if self.folder_search:
+            self.folder_search.cancel()
+            self.folder_search = None
+            self.cancel_button.config(state=tk.DISABLED)
+            self.status_label.config(text="Поиск остановлен")
+
+    def open_selected(self):
+        selection = self.result_list.curselection()
+        if not selection:
+            return
+        path, line, _ = self.results[selection[0]]
+        self.open_result(path, line)
+
+    def close(self):
+        self.cancel_folder_search()
+        self.stop_indexing()
+        if self.index:
+            self.index.close()
+            self.index = None
+        self.window.destroy()
@@ -7,6 +7,10 @@ class LineNumbers(tk.Canvas):
         self.text_widget = None
         self.configure(width=50, highlightthickness=0)
 
+        # Переиспользуемые элементы холста: [id, текст, y, виден]
+        self._items = []
+        self._redraw_job = None
+
     def attach(self, text_widget):
         self.text_widget = text_widget
         self.text_widget.bind("<Configure>", self.on_configure)
@@ -20,16 +24,46 @@ class LineNumbers(tk.Canvas):
         self.redraw()
 
     def redraw(self):
+        """Планирует перерисовку: несколько вызовов за кадр сливаются в один"""
+        if self._redraw_job is None:
+            self._redraw_job = self.after_idle(self._redraw)
+
+    def _redraw(self):
+        self._redraw_job = None
         if not self.text_widget:
             return
 
-        self.delete("all")
+        count = 0
         i = self.text_widget.index("@0,0")
         while True:
             dline = self.text_widget.dlineinfo(i)
             if dline is None:
                 break
-            y = dline[1]
-            line_num = str(i).split(".")[0]
-            self.create_text(45, y, anchor="ne", text=line_num, fill="#666666")
+            self._place(count, str(i).split(".")[0], dline[1])
+            count += 1
             i = self.text_widget.index(f"{i}+1line")
+
+        # Лишние элементы прячем, а не удаляем
+        for item in self._items[count:]:
+            if item[3]:
+                self.itemconfigure(item[0], state="hidden")
+                item[3] = False
+
+    def _place(self, n, line_num, y):
+        if n == len(self._items):
+            item_id = self.create_text(
+                45, y, anchor="ne", text=line_num, fill="#666666"
+            )
+            self._items.append([item_id, line_num, y, True])
+            return
+
+        item = self._items[n]
+        if item[1] != line_num:
+            self.itemconfigure(item[0], text=line_num)
+            item[1] = line_num
+        if item[2] != y:
+            self.coords(item[0], 45, y)
+            item[2] = y
+        if not item[3]:
+            self.itemconfigure(item[0], state="normal")
+            item[3] = True
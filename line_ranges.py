@@ -0,0 +1,68 @@
+from bisect import bisect_left, bisect_right
+
+
+class LineRanges:
+    """Отсортированный набор непересекающихся диапазонов строк [first, last]"""
+
+    def __init__(self):
+        self.firsts = []
+        self.lasts = []
+
+    def __iter__(self):
+        return iter(zip(self.firsts, self.lasts))
+
+    def __bool__(self):
+        return bool(self.firsts)
+
+    def clear(self):
+        self.firsts.clear()
+        self.lasts.clear()
+
+    def add(self, first, last):
+        """Добавляет диапазон, сливая его с пересекающимися и соседними"""
+        if first > last:
+            return
+        lo = bisect_left(self.lasts, first - 1)
+        hi = bisect_right(self.firsts, last + 1)
+        if lo < hi:
+            first = min(first, self.firsts[lo])
+            last = max(last, self.lasts[hi - 1])
+        self.firsts[lo:hi] = [first]
+        self.lasts[lo:hi] = [last]
+
+    def missing(self, first, last):
+        """Возвращает части диапазона [first, last], не покрытые набором"""
+        result = []
+        i = bisect_left(self.lasts, first)
+        current = first
+        while current <= last and i < len(self.firsts):
+            if self.firsts[i] > last:
+                break
+            if self.firsts[i] > current:
+                result.append((current, self.firsts[i] - 1))
+            current = max(current, self.lasts[i] + 1)
+            i += 1
+        if current <= last:
+            result.append((current, last))
+        return result
+
+    def shift(self, line, delta):
+        """Сдвигает строки после line на delta (delta < 0 — строки удалены)"""
+        if not delta:
+            return
+        i = bisect_left(self.lasts, line + 1)
+        firsts = self.firsts[:i]
+        lasts = self.lasts[:i]
+        for first, last in zip(self.firsts[i:], self.lasts[i:]):
+            if first > line:
+                first = max(line + 1, first + delta)
+            last = max(line, last + delta)
+            if first > last:
+                continue
+            if lasts and first <= lasts[-1] + 1:
+                lasts[-1] = max(lasts[-1], last)
+            else:
+                firsts.append(first)
+                lasts.append(last)
+        self.firsts = firsts
+        self.lasts = lasts
@@ -3,14 +3,17 @@ import os
 import subprocess
 import sys
 import tempfile
+import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox
 
 from bnf_editor import BnfEditor
 from book_exporter import BookExporter
 from dialog_manager import DialogManager
+from library_search import LibrarySearchDialog
 from line_numbers import LineNumbers
 from markdown_text import MarkdownText
+from paragraph_alignment import ParagraphAlignment
 from search_dialog import SearchDialog
 from text_corrector import TextCorrector
 from toc_list import TOCList
@@ -18,6 +21,12 @@ from tooltip import ToolTip
 
 CONFIG_FILE = "replacements.json"
 
+# Пауза после правки перед пересчётом выравнивания и опрос фонового расчёта
+ALIGNMENT_DELAY_MS = 500
+ALIGNMENT_POLL_MS = 20
+# Синхронизация прокрутки не чаще одного раза за кадр
+SYNC_FRAME_MS = 16
+
 TEMP_DIR = os.path.join(tempfile.gettempdir(), "paraline_editor")
 os.makedirs(TEMP_DIR, exist_ok=True)
 
@@ -38,6 +47,14 @@ class SideBySideEditor:
         self.trans_path = ""
         self.syncing = False
 
+        # Соответствие строк оригинала и перевода
+        self.alignment = ParagraphAlignment()
+        self._alignment_job = None
+        self._alignment_thread = None
+        self._alignment_result = None
+        self._sync_job = None
+        self._pending_sync = None
+
         # Верхний фрейм с заголовком и кнопками
         self.top_frame = tk.Frame(root)
         self.top_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -164,6 +181,15 @@ class SideBySideEditor:
         self.correct_button.pack(side=tk.LEFT, padx=(0, 5))
         ToolTip(self.correct_button, "Correct text")
 
+        self.library_button = tk.Button(
+            self.buttons_frame,
+            text="📚",
+            command=self.open_library_search,
+            font=("Noto Color Emoji", 12, "bold"),
+        )
+        self.library_button.pack(side=tk.LEFT, padx=(0, 5))
+        ToolTip(self.library_button, "Search Library")
+
         self.exit_button = tk.Button(
             self.buttons_frame,
             text="❌",
@@ -300,10 +326,10 @@ class SideBySideEditor:
         self.left_text.edit_modified(False)
 
         # Фрейм для номеров строк + поле перехода
-        left_num_frame = tk.Frame(self.left_frame)
-        left_num_frame.pack(side=tk.LEFT, fill=tk.Y)
+        self.left_num_frame = tk.Frame(self.left_frame)
+        self.left_num_frame.pack(side=tk.LEFT, fill=tk.Y)
 
-        self.left_line_numbers = LineNumbers(left_num_frame, width=50)
+        self.left_line_numbers = LineNumbers(self.left_num_frame, width=50)
         self.left_line_numbers.pack(side=tk.TOP, fill=tk.Y, expand=True)
         self.left_line_numbers.attach(self.left_text)
 
@@ -380,6 +406,11 @@ class SideBySideEditor:
         self.right_text.tag_configure(
             "current_line", background="#e7ff00", selectbackground="#77b8ff"
         )
+        # Границы подсвеченной строки: метки сдвигаются вместе с текстом
+        for text_widget in (self.left_text, self.right_text):
+            text_widget.mark_set("current_line_start", "1.0")
+            text_widget.mark_gravity("current_line_start", "left")
+            text_widget.mark_set("current_line_end", "1.0")
 
         self.left_text.bind("<ButtonRelease-1>", self.highlight_current_line_left)
         self.right_text.bind("<ButtonRelease-1>", self.highlight_current_line_right)
@@ -405,6 +436,9 @@ class SideBySideEditor:
 
         root.bind("<Control-f>", self.on_ctrl_f)
 
+        self.left_text.add_edit_listener(self.on_left_text_edit)
+        self.right_text.add_edit_listener(self.on_right_text_edit)
+
         if len(sys.argv) > 1:
             file_path = sys.argv[1]
             self.load_md_pair(file_path)
@@ -413,34 +447,73 @@ class SideBySideEditor:
         self.right_text.after(300, self.update_right_text)
 
     def update_right_text(self):
-        self.right_text.schedule_highlight_markdown()
         self.right_toc.schedule_update()
 
     def update_left_text_async(self):
         self.left_text.after(300, self.update_left_text)
 
     def update_left_text(self):
-        self.left_text.schedule_highlight_markdown()
         self.left_toc.schedule_update()
 
     def on_righ_text_modified(self, *args):
         self.right_text.on_text_modified()
         line = int(self.right_text.index("insert").split(".")[0])
-        text = self.right_text.get(f"{line}.0", f"{line}.end").lstrip()
-        if text.startswith("#"):
-            self.right_toc.schedule_update()
-        elif self.right_toc.check_contains_text(text):
+        text = self.right_text.document.line(line).lstrip()
+        if text.startswith("#") or self.right_toc.is_heading_line(line):
             self.right_toc.schedule_update()
 
     def on_left_text_modified(self, *args):
         self.left_text.on_text_modified()
         line = int(self.left_text.index("insert").split(".")[0])
-        text = self.left_text.get(f"{line}.0", f"{line}.end").lstrip()
-        if text.startswith("#"):
-            self.left_toc.schedule_update()
-        elif self.left_toc.check_contains_text(text):
+        text = self.left_text.document.line(line).lstrip()
+        if text.startswith("#") or self.left_toc.is_heading_line(line):
             self.left_toc.schedule_update()
 
+    def on_left_text_edit(self, first, removed, added):
+        self.alignment.edit_left(first, removed, added)
+        self.schedule_alignment_update()
+
+    def on_right_text_edit(self, first, removed, added):
+        self.alignment.edit_right(first, removed, added)
+        self.schedule_alignment_update()
+
+    def schedule_alignment_update(self):
+        if self._alignment_job:
+            self.root.after_cancel(self._alignment_job)
+        self._alignment_job = self.root.after(
+            ALIGNMENT_DELAY_MS, self.update_alignment
+        )
+
+    def update_alignment(self):
+        """Пересчитывает выравнивание абзацев в фоновом потоке"""
+        self._alignment_job = None
+        if self._alignment_thread and self._alignment_thread.is_alive():
+            self.schedule_alignment_update()
+            return
+
+        revisions = (self.left_text.revision, self.right_text.revision)
+        left_lines = self.left_text.document.lines()
+        right_lines = self.right_text.document.lines()
+
+        def work():
+            result = self.alignment.build(left_lines, right_lines)
+            self._alignment_result = (revisions, result)
+
+        self._alignment_result = None
+        self._alignment_thread = threading.Thread(target=work, daemon=True)
+        self._alignment_thread.start()
+        self.root.after(ALIGNMENT_POLL_MS, self._poll_alignment)
+
+    def _poll_alignment(self):
+        if self._alignment_result is None:
+            self.root.after(ALIGNMENT_POLL_MS, self._poll_alignment)
+            return
+        revisions, result = self._alignment_result
+        self._alignment_result = None
+        # Если текст успел измениться, уже запланирован новый пересчёт
+        if revisions == (self.left_text.revision, self.right_text.revision):
+            self.alignment.apply(result)
+
     def open_metadata_dialog(self):
         if not self.orig_path:
             DialogManager.show_dialog("Ошибка", "Сначала откройте файл.")
@@ -459,7 +532,36 @@ class SideBySideEditor:
         self.open_search_dialog(self.right_text)
 
     def open_search_dialog(self, text_frame):
-        SearchDialog(self.root, text_frame)
+        if text_frame is self.left_text:
+            toc = self.left_toc
+        elif text_frame is self.right_text:
+            toc = self.right_toc
+        else:
+            toc = None
+        SearchDialog(self.root, text_frame, toc)
+
+    def open_library_search(self):
+        # По умолчанию библиотека — папка открытой книги
+        library_dir = os.path.dirname(self.orig_path) if self.orig_path else ""
+        LibrarySearchDialog(self.root, library_dir, self.open_library_result)
+
+    def open_library_result(self, path, line):
+        """Открывает пару книг и ставит курсор на найденную строку"""
+        if path not in (self.orig_path, self.trans_path):
+            self.load_md_pair(path)
+            if path not in (self.orig_path, self.trans_path):
+                # Пара не загрузилась: курсор в открытой книге не трогаем
+                return
+        # Оригинал .en.md всегда открывается слева
+        if path.endswith(".en.md"):
+            text_widget = self.left_text
+            self.highlight_current_line_left()
+        else:
+            text_widget = self.right_text
+            self.highlight_current_line_right()
+        text_widget.mark_set("insert", f"{line}.0")
+        text_widget.see("insert")
+        text_widget.focus_set()
 
     def correct_text(self):
         self.left_text_corrector = TextCorrector(self.left_text)
@@ -471,10 +573,12 @@ class SideBySideEditor:
         self.right_toc.schedule_update()
 
     def on_text_scroll_left(self, *args):
+        self.left_text.highlight_visible()
         self.left_line_numbers.redraw()
         self.left_scroll.set(args[0], args[1])
 
     def on_text_scroll_right(self, *args):
+        self.right_text.highlight_visible()
         self.right_line_numbers.redraw()
         self.right_scroll.set(args[0], args[1])
 
@@ -486,12 +590,13 @@ class SideBySideEditor:
     def jump_to_line(self, entry_widget):
         try:
             line_num = int(entry_widget.get())
+            right_line = self.alignment.left_to_right(line_num)
 
             self.left_text.mark_set("insert", f"{line_num}.0")
             self.left_text.see(f"{line_num}.0")
 
-            self.right_text.mark_set("insert", f"{line_num}.0")
-            self.right_text.see(f"{line_num}.0")
+            self.right_text.mark_set("insert", f"{right_line}.0")
+            self.right_text.see(f"{right_line}.0")
 
             self.left_text.focus_set()
 
@@ -507,40 +612,27 @@ class SideBySideEditor:
         self.toggle_right_toc_button.config(text="📑")
 
     def toggle_left_toc(self):
-        if self.left_toc.winfo_ismapped():
+        if self.left_toc.winfo_manager():
             self.left_toc.pack_forget()
             self.left_toc_scroll.pack_forget()
             self.toggle_left_toc_button.config(text="📑")  # скрыт
         else:
-            self.left_toc = TOCList(self.left_frame, None)
-            self.left_toc_scroll = tk.Scrollbar(
-                self.left_frame, orient=tk.VERTICAL, command=self.left_toc.yview
-            )
-            self.left_toc.configure(yscrollcommand=self.left_toc_scroll.set)
+            # Виджеты и индекс заголовков живут всё время, их только возвращаем
+            self.left_toc.pack(side=tk.LEFT, fill=tk.Y, before=self.left_num_frame)
             self.left_toc_scroll.pack(
-                side=tk.LEFT, fill=tk.Y, before=self.left_line_numbers
+                side=tk.LEFT, fill=tk.Y, before=self.left_num_frame
             )
-            self.left_toc.pack(side=tk.LEFT, fill=tk.Y, before=self.left_toc_scroll)
-
-            self.left_toc.text_widget = self.left_text
             self.left_toc.update_toc()
             self.toggle_left_toc_button.config(text="👈")  # показан
 
     def toggle_right_toc(self):
-        if self.right_toc.winfo_ismapped():
+        if self.right_toc.winfo_manager():
             self.right_toc.pack_forget()
             self.right_toc_scroll.pack_forget()
             self.toggle_right_toc_button.config(text="📑")  # скрыт
         else:
-            self.right_toc = TOCList(self.right_frame, None)
-            self.right_toc_scroll = tk.Scrollbar(
-                self.right_frame, orient=tk.VERTICAL, command=self.right_toc.yview
-            )
-            self.right_toc.configure(yscrollcommand=self.right_toc_scroll.set)
-            self.right_toc_scroll.pack(
-                side=tk.RIGHT, fill=tk.Y, after=self.right_scroll
-            )
-            self.right_toc.pack(side=tk.RIGHT, fill=tk.Y, before=self.right_toc_scroll)
+            self.right_toc_scroll.pack(side=tk.RIGHT, fill=tk.Y, before=self.right_text)
+            self.right_toc.pack(side=tk.RIGHT, fill=tk.Y, before=self.right_text)
             self.right_toc.update_toc()
             self.toggle_right_toc_button.config(text="👉")  # показан
 
@@ -575,7 +667,7 @@ class SideBySideEditor:
             self.file_title.config(text="Файл не загружен")
 
     def save_text_to_file(self, text_widget, path):
-        content = text_widget.get("1.0", "end-1c")
+        content = text_widget.document.text()
 
         with open(path, "w", encoding="utf-8") as f:
             f.write(content)
@@ -584,7 +676,7 @@ class SideBySideEditor:
         filename = f"temporary.{lang}.md"
         path = os.path.join(TEMP_DIR, filename)
 
-        content = self.left_text.get("1.0", "end-1c")
+        content = self.left_text.document.text()
 
         with open(path, "w", encoding="utf-8") as f:
             f.write(content)
@@ -631,11 +723,9 @@ class SideBySideEditor:
             with open(self.trans_path, "r", encoding="utf-8") as f:
                 translation_lines = f.read()
 
-            self.left_text.delete("1.0", tk.END)
-            self.right_text.delete("1.0", tk.END)
-
-            self.left_text.insert(tk.END, original_lines)
-            self.right_text.insert(tk.END, translation_lines)
+            # Дифф вместо полной перезаписи: перезагрузку можно отменить
+            self.left_text.set_text(original_lines)
+            self.right_text.set_text(translation_lines)
 
             self.left_text.highlight_markdown()
             self.right_text.highlight_markdown()
@@ -704,6 +794,10 @@ class SideBySideEditor:
             self.left_text.insert(tk.END, original_lines)
             self.right_text.insert(tk.END, translation_lines)
 
+            # История правок предыдущей книги не переносится на новую
+            self.left_text.edit_reset()
+            self.right_text.edit_reset()
+
             self.left_text.highlight_markdown()
             self.right_text.highlight_markdown()
 
@@ -771,13 +865,14 @@ class SideBySideEditor:
         try:
             # Получаем номер текущей строки в левом поле
             index = self.left_text.index("insert")
-            line_num = index.split(".")[0]
+            line_num = int(index.split(".")[0])
 
-            # Устанавливаем курсор в правом поле на ту же строку
-            self.right_text.mark_set("insert", f"{line_num}.0")
+            # Ставим курсор в правом поле на соответствующую строку перевода
+            right_line = self.alignment.left_to_right(line_num)
+            self.right_text.mark_set("insert", f"{right_line}.0")
 
             # Выравниваем строки параллельно
-            self.align_lines_parallel(line_num, TextFieldType.LEFT)
+            self.align_lines_parallel(line_num, right_line, TextFieldType.LEFT)
         finally:
             self.syncing = False
 
@@ -788,54 +883,51 @@ class SideBySideEditor:
         try:
             # Получаем номер текущей строки в правом поле
             index = self.right_text.index("insert")
-            line_num = index.split(".")[0]
+            line_num = int(index.split(".")[0])
 
-            # Устанавливаем курсор в левом поле на ту же строку
-            self.left_text.mark_set("insert", f"{line_num}.0")
+            # Ставим курсор в левом поле на соответствующую строку оригинала
+            left_line = self.alignment.right_to_left(line_num)
+            self.left_text.mark_set("insert", f"{left_line}.0")
 
             # Выравниваем строки параллельно
-            self.align_lines_parallel(line_num, TextFieldType.RIGHT)
+            self.align_lines_parallel(left_line, line_num, TextFieldType.RIGHT)
         finally:
             self.syncing = False
 
-    def align_lines_parallel(self, line_num, text_field_type):
-        try:
-            # Показываем строку в центре каждого виджета
-            self.left_text.see(f"{line_num}.0")
-            self.right_text.see(f"{line_num}.0")
-
-            self.root.update_idletasks()
-
-            if text_field_type == TextFieldType.LEFT:
-                cursor_pos = self.left_text.index(tk.INSERT)
-                bbox = self.left_text.bbox(cursor_pos)
-                if bbox:
-                    y_pixel = bbox[1]
-                    # Передаём реальный индекс позиции курсора, а не начало строки
-                    self.adjust_scroll_to_position(self.right_text, cursor_pos, y_pixel)
-            elif text_field_type == TextFieldType.RIGHT:
-                cursor_pos = self.right_text.index(tk.INSERT)
-                bbox = self.right_text.bbox(cursor_pos)
-                if bbox:
-                    y_pixel = bbox[1]
-                    self.adjust_scroll_to_position(self.left_text, cursor_pos, y_pixel)
-        except:
-            self.left_text.see(f"{line_num}.0")
-            self.right_text.see(f"{line_num}.0")
+    def align_lines_parallel(self, left_line, right_line, text_field_type):
+        """Планирует выравнивание прокрутки: за кадр выполняется одно, последнее"""
+        self._pending_sync = (left_line, right_line, text_field_type)
+        if self._sync_job is None:
+            self._sync_job = self.root.after(SYNC_FRAME_MS, self._sync_scroll)
+
+    def _sync_scroll(self):
+        """Ставит строку второго поля на ту же высоту, что строку курсора
+
+        Высоты берутся из кэша строк Tk, а вид меняется одним yview_moveto,
+        поэтому раскладка не пересчитывается синхронно.
+        """
+        self._sync_job = None
+        left_line, right_line, text_field_type = self._pending_sync
+        if text_field_type == TextFieldType.LEFT:
+            src, dst = self.left_text, self.right_text
+            src_line, dst_line = left_line, right_line
+        else:
+            src, dst = self.right_text, self.left_text
+            src_line, dst_line = right_line, left_line
 
-    def adjust_scroll_to_position(self, text_widget, target_index, target_y):
-        """Корректирует прокрутку, чтобы указанная позиция была на заданной высоте"""
         try:
-            bbox = text_widget.bbox(target_index)
-            if bbox is None:
+            src_total = src.pixel_offset("end")
+            dst_total = dst.pixel_offset("end")
+            if not src_total or not dst_total:
                 return
-            current_y = bbox[1]
-            diff = target_y - current_y
-            if abs(diff) > 5:
-                line_height = bbox[3] if bbox[3] > 0 else 16
-                scroll_lines = diff / line_height
-                text_widget.yview_scroll(int(-scroll_lines), "units")
-        except:
+            # Высота строки курсора над верхним краем видимой области
+            src_top = src.yview()[0] * src_total
+            y = src.pixel_offset(f"{src_line}.0") - src_top
+
+            target = max(0, dst.pixel_offset(f"{dst_line}.0") - y) / dst_total
+            if abs(target - dst.yview()[0]) * dst_total >= 1:
+                dst.yview_moveto(target)
+        except tk.TclError:
             pass
 
     def export_parallel_book(self, book_type):
@@ -843,8 +935,8 @@ class SideBySideEditor:
             DialogManager.show_dialog("Ошибка", "Файлы не загружены")
             return
 
-        original_lines = self.left_text.get("1.0", tk.END).strip().splitlines()
-        translated_lines = self.right_text.get("1.0", tk.END).strip().splitlines()
+        original_lines = self.left_text.document.text().strip().splitlines()
+        translated_lines = self.right_text.document.text().strip().splitlines()
 
         max_len = max(len(original_lines), len(translated_lines))
         original_lines += [""] * (max_len - len(original_lines))
@@ -882,8 +974,8 @@ class SideBySideEditor:
                     self.trans_path = base + ".ru.md"
 
             # 🔹 ПОЛУЧАЕМ ТЕКСТ
-            original_text = self.left_text.get("1.0", "end-1c").splitlines()
-            translated_text = self.right_text.get("1.0", "end-1c").splitlines()
+            original_text = self.left_text.document.text().splitlines()
+            translated_text = self.right_text.document.text().splitlines()
 
             # 🔹 ВЫРАВНИВАНИЕ СТРОК
             # max_len = max(len(original_text), len(translated_text))
@@ -930,11 +1022,17 @@ class SideBySideEditor:
         self._highlight_line(dst_text)
 
     def _highlight_line(self, text_widget):
-        text_widget.tag_remove("current_line", "1.0", "end")
-        index = text_widget.index("insert")
-        line_start = f"{index.split('.')[0]}.0"
-        line_end = f"{index.split('.')[0]}.end"
-        text_widget.tag_add("current_line", line_start, line_end)
+        """Переносит подсветку: трогает только прежнюю и новую строку курсора"""
+        line = text_widget.index("insert linestart")
+        if (
+            text_widget.index("current_line_start") == line
+            and "current_line" in text_widget.tag_names(line)
+        ):
+            return
+        text_widget.tag_remove("current_line", "current_line_start", "current_line_end")
+        text_widget.tag_add("current_line", line, f"{line} lineend")
+        text_widget.mark_set("current_line_start", line)
+        text_widget.mark_set("current_line_end", f"{line} lineend")
 
 
 def clear_temp_dir():
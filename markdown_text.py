@@ -1,24 +1,330 @@
+import difflib
 import re
+import threading
+import time
 import tkinter as tk
-from tkinter import font
+
+from font_registry import FontRegistry
+from line_ranges import LineRanges
+from markdown_tokenizer import MARKDOWN_TAGS, LineTokenCache
+from text_document import TextDocument
+from undo_journal import UndoJournal
 
 WORD_CHARS = r"[A-Za-zА-Яа-яЁё0-9_-]"
 SPACE_CHARS = r"\s"
 PUNCT_CHARS = r"[^\w\s]"
 
+# Сколько диапазонов передавать в один вызов tag_add
+TAG_ADD_CHUNK = 2000
+
+# Документы длиннее этого числа строк подсвечиваются лениво, по видимой области
+LAZY_HIGHLIGHT_MIN_LINES = 2000
+# Сколько строк подсвечивать сверх видимой области
+LAZY_HIGHLIGHT_MARGIN = 100
+
+# Фоновая подсветка: опрос потока, бюджет одной порции и размер порции в строках
+BACKGROUND_POLL_MS = 20
+BACKGROUND_RETRY_MS = 300
+BACKGROUND_CHUNK_BUDGET = 0.015
+BACKGROUND_CHUNK_LINES = 200
+
+# Сколько строк хранить в кэше спанов каждого виджета
+TOKEN_CACHE_SIZE = 100_000
+
+# set_text сравнивает изменённую середину текста построчным диффом, только
+# если в ней не больше этого числа строк, иначе заменяет её целиком
+SET_TEXT_DIFF_LINES = 1000
+
+# Предел памяти журнала отмены в байтах
+UNDO_BYTE_BUDGET = 64 * 1024 * 1024
+# Символы вне BMP (эмодзи): Tcl/Tk 8.6 хранит их суррогатными парами, и в
+# индексах Tk каждый такой символ занимает два столбца
+NON_BMP_CHARS = re.compile("[\U00010000-\U0010FFFF]")
+# Подкоманды edit, которые обслуживает журнал
+JOURNAL_COMMANDS = ("undo", "redo", "separator", "reset", "canundo", "canredo")
+
+
+def _index_key(index):
+    """Индекс Tk "строка.столбец" в сравнимый кортеж"""
+    line, col = str(index).split(".")
+    return int(line), int(col)
+
+
+def tk_column(line, col):
+    """Столбец Tk для столбца col строки, если символы вне BMP занимают два"""
+    return col + len(NON_BMP_CHARS.findall(line, 0, col))
+
+
+def python_column(line, tk_col):
+    """Столбец строки для столбца Tk, если символы вне BMP занимают два"""
+    if not NON_BMP_CHARS.search(line, 0, tk_col):
+        return tk_col
+    units = 0
+    for col, char in enumerate(line):
+        if units >= tk_col:
+            return col
+        units += 2 if char > "\uffff" else 1
+    return len(line)
+
 
 class MarkdownText(tk.Text):
     """Кастомный Text виджет с подсветкой Markdown"""
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.base_font = font.Font(family="Monospace", size=10)
+        # Шрифты общие для обеих панелей: масштаб меняется сразу везде
+        self.fonts = FontRegistry.shared(self)
+        self.base_font = self.fonts.base_font
         self.config(font=self.base_font)
 
-        self.configure(undo=True, maxundo=20)
+        # Встроенный undo Tk хранит копии текста: историю ведёт UndoJournal
+        self.configure(undo=False)
+        self.journal = UndoJournal(UNDO_BYTE_BUDGET)
+        self._journal_suspended = False
         self.configure_tags()
         self.configure_bindings()
-        self._update_job = None
+
+        self.lazy_highlight = False
+        self.highlighted_lines = LineRanges()
+        self.dirty_lines = LineRanges()
+        self.token_cache = LineTokenCache(TOKEN_CACHE_SIZE)
+
+        # Копия содержимого в Python: строки читаются без обращений к Tcl
+        self.document = TextDocument()
+        # Tcl/Tk 8.6 считает символ вне BMP за два, Tcl 9 — за один
+        self.wide_chars = self.tk.call("string", "length", "\U0001F600") == 2
+        self._edit_listeners = []
+
+        # Номер правки: фоновая подсветка отбрасывается, если текст изменился
+        self.revision = 0
+        self._highlight_job = 0
+        # Итоги фоновой токенизации по номеру задания
+        self._background_results = {}
+        self._background_retry = None
+
+        # Перехватываем Tcl-команду виджета, чтобы знать, какие строки менялись
+        self._orig_cmd = self._w + "_orig"
+        self.tk.call("rename", self._w, self._orig_cmd)
+        self.tk.createcommand(self._w, self._dispatch)
+
+    def destroy(self):
+        super().destroy()
+        self.tk.deletecommand(self._w)
+
+    def _dispatch(self, *args):
+        """Прокси команды виджета: правки отмечают грязные строки и идут в журнал"""
+        op = args[0] if args else ""
+        if op == "edit" and len(args) == 2 and args[1] in JOURNAL_COMMANDS:
+            return self._journal_command(args[1])
+        if op not in ("insert", "delete", "replace"):
+            return self.tk.call((self._orig_cmd,) + args)
+        if op == "delete" and len(args) > 3:
+            return self._delete_ranges(args[1:])
+
+        end_index = self.tk.call(self._orig_cmd, "index", "end-1c")
+        start = self.tk.call(self._orig_cmd, "index", args[1])
+        removed = ""
+        if op == "insert":
+            inserted = "".join(args[2::2])
+        else:
+            inserted = "".join(args[3::2])
+            stop = args[2] if len(args) > 2 else f"{start}+1c"
+            stop = self.tk.call(self._orig_cmd, "index", stop)
+            if _index_key(stop) > _index_key(start):
+                start, stop = self._deleted_range(start, stop, end_index)
+                removed = self.tk.call(self._orig_cmd, "get", start, stop)
+        start = self._clamp_index(start, end_index)
+
+        result = self.tk.call((self._orig_cmd,) + args)
+        self.revision += 1
+        if not self._journal_suspended:
+            self.journal.record(start, removed, inserted)
+
+        first, col = _index_key(start)
+        if self.wide_chars:
+            col = python_column(self.document.line(first), col)
+        self.document.replace(first, col, removed, inserted)
+        last = self.document.line_count()
+        delta = inserted.count("\n") - removed.count("\n")
+        self.highlighted_lines.shift(first, delta)
+        self.dirty_lines.shift(first, delta)
+        self.dirty_lines.add(first, min(first + inserted.count("\n"), last))
+
+        self._check_document()
+
+        for listener in self._edit_listeners:
+            listener(first, removed.count("\n"), inserted.count("\n"))
+        return result
+
+    def _check_document(self):
+        """Сверяет конец копии текста с виджетом, при расхождении перечитывает
+
+        Страховка на случай правила Tk, которое прокси не повторяет: иначе
+        в файл при сохранении ушёл бы не тот текст, что на экране.
+        """
+        line, col = _index_key(self.tk.call(self._orig_cmd, "index", "end-1c"))
+        last = self.document.line_count()
+        if line != last or col != self.tk_length(self.document.line(last)):
+            self.document.set_text(
+                self.tk.call(self._orig_cmd, "get", "1.0", "end-1c")
+            )
+
+    def add_edit_listener(self, listener):
+        """Подписка на правки: listener(first, removed, added)
+
+        Строки first..first+removed заменены строками first..first+added.
+        """
+        if listener not in self._edit_listeners:
+            self._edit_listeners.append(listener)
+
+    def document_position(self, index):
+        """Позиция (строка, столбец) в document для индекса Tk"""
+        line, col = _index_key(self.index(index))
+        if self.wide_chars:
+            col = python_column(self.document.line(line), col)
+        return line, col
+
+    def tk_index(self, line, col):
+        """Индекс Tk для позиции (строка, столбец) в document"""
+        if self.wide_chars:
+            col = tk_column(self.document.line(line), col)
+        return f"{line}.{col}"
+
+    def tk_length(self, text):
+        """Длина текста в символах Tk, для смещений вида +Nc"""
+        if self.wide_chars:
+            return len(text) + len(NON_BMP_CHARS.findall(text))
+        return len(text)
+
+    def _clamp_index(self, index, end_index):
+        """Индекс правки: всё, что за end-1c, Tk относит к концу текста"""
+        if _index_key(index) > _index_key(end_index):
+            return end_index
+        return index
+
+    def _deleted_range(self, start, stop, end_index):
+        """Диапазон, который на самом деле удалит Tk (DeleteIndexRange)
+
+        Конец за end-1c Tk переносит на end-1c, а начало в столбце 0 не
+        первой строки — на перевод строки перед ним: удаление целых строк до
+        конца текста забирает и перевод строки перед ними.
+        """
+        if _index_key(stop) <= _index_key(end_index):
+            return start, stop
+        line, col = _index_key(start)
+        if col == 0 and line > 1:
+            start = self.tk.call(self._orig_cmd, "index", f"{start}-1c")
+        return start, end_index
+
+    def _delete_ranges(self, indices):
+        """Удаление нескольких диапазонов как серии простых удалений с конца"""
+        ranges = []
+        for i in range(0, len(indices), 2):
+            start = self.tk.call(self._orig_cmd, "index", indices[i])
+            if i + 1 < len(indices):
+                stop = self.tk.call(self._orig_cmd, "index", indices[i + 1])
+            else:
+                stop = self.tk.call(self._orig_cmd, "index", f"{start}+1c")
+            ranges.append((_index_key(start), _index_key(stop), start, stop))
+
+        merged = []
+        for start_key, stop_key, start, stop in sorted(ranges):
+            if merged and start_key <= merged[-1][1]:
+                if stop_key > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], stop_key, merged[-1][2], stop)
+            else:
+                merged.append((start_key, stop_key, start, stop))
+
+        for _, _, start, stop in reversed(merged):
+            self._dispatch("delete", start, stop)
+        return ""
+
+    def _journal_command(self, command):
+        """edit undo/redo/separator/reset обслуживаются журналом, а не Tk"""
+        if command == "undo":
+            self._apply_journal_step(self.journal.pop_undo(), undo=True)
+        elif command == "redo":
+            self._apply_journal_step(self.journal.pop_redo(), undo=False)
+        elif command == "separator":
+            self.journal.separator()
+        elif command == "reset":
+            self.journal.reset()
+        elif command == "canundo":
+            return int(self.journal.can_undo())
+        elif command == "canredo":
+            return int(self.journal.can_redo())
+        return ""
+
+    def _apply_journal_step(self, step, undo):
+        if not step:
+            return
+        records = reversed(step) if undo else step
+        self._journal_suspended = True
+        try:
+            for index, removed, inserted in records:
+                old, new = (inserted, removed) if undo else (removed, inserted)
+                if old:
+                    self.delete(index, f"{index}+{self.tk_length(old)}c")
+                if new:
+                    self.insert(index, new)
+                cursor = f"{index}+{self.tk_length(new)}c"
+        finally:
+            self._journal_suspended = False
+        self.mark_set("insert", cursor)
+        self.see("insert")
+
+    def set_text(self, text):
+        """Заменяет весь текст, правя только изменившиеся строки
+
+        Общие начало и конец текста отбрасываются за линейное время. Средняя
+        часть правится по построчному диффу, только если она невелика,
+        иначе — одной заменой. Правки записываются в журнал одним шагом
+        отмены, а подсветка обновляется только для изменённых строк.
+        """
+        old_lines = self.document.lines()
+        new_lines = text.split("\n")
+
+        # Общие строки в начале и в конце текста
+        limit = min(len(old_lines), len(new_lines))
+        head = 0
+        while head < limit and old_lines[head] == new_lines[head]:
+            head += 1
+        tail = 0
+        while tail < limit - head and old_lines[-1 - tail] == new_lines[-1 - tail]:
+            tail += 1
+        old_end = len(old_lines) - tail
+        new_end = len(new_lines) - tail
+
+        if old_end - head + new_end - head <= SET_TEXT_DIFF_LINES:
+            matcher = difflib.SequenceMatcher(
+                None, old_lines[head:old_end], new_lines[head:new_end]
+            )
+            opcodes = [
+                (op, i1 + head, i2 + head, j1 + head, j2 + head)
+                for op, i1, i2, j1, j2 in matcher.get_opcodes()
+                if op != "equal"
+            ]
+        else:
+            # Дифф большой середины растёт быстрее линейного: одна замена
+            opcodes = [("replace", head, old_end, head, new_end)]
+
+        with self.journal.group():
+            for op, i1, i2, j1, j2 in reversed(opcodes):
+                chunk = "\n".join(new_lines[j1:j2])
+                if i1 == i2:
+                    # Вставка строк перед строкой i1 + 1 (или в конец текста)
+                    if i1 < len(old_lines):
+                        self.insert(f"{i1 + 1}.0", chunk + "\n")
+                    else:
+                        self.insert(f"{i1}.end", "\n" + chunk)
+                elif j1 == j2:
+                    # Удаление строк i1 + 1 .. i2 вместе с переводами строк
+                    if i2 < len(old_lines):
+                        self.delete(f"{i1 + 1}.0", f"{i2 + 1}.0")
+                    else:
+                        self.delete(f"{i1}.end", f"{i2}.end")
+                else:
+                    self.replace(f"{i1 + 1}.0", f"{i2}.end", chunk)
 
     def configure_bindings(self):
         self.bind("<Control-b>", lambda e: self.format_line("bold"))
@@ -31,7 +337,7 @@ class MarkdownText(tk.Text):
 
         self.bind("<Control-plus>", lambda e: self.zoom(1))
         self.bind("<Control-minus>", lambda e: self.zoom(-1))
-        self.bind("<Control-0>", lambda e: self.base_font.configure(size=12))
+        self.bind("<Control-0>", lambda e: self.fonts.set_size(12))
 
         self.bind("<Control-BackSpace>", self.delete_word_left)
         self.bind("<Control-Delete>", self.delete_word_right)
@@ -85,321 +391,198 @@ class MarkdownText(tk.Text):
         return "break"
 
     def zoom(self, delta):
-        size = self.base_font.actual("size") + delta
+        size = self.fonts.size + delta
         if size >= 8:
-            self.base_font.configure(size=size)
-
-    def schedule_highlight_markdown(self):
-        if self._update_job:
-            self.after_cancel(self._update_job)
-        self._update_job = self.after(300, self.highlight_markdown)
+            self.fonts.set_size(size)
 
     def configure_tags(self):
         """Настройка стилей для Markdown-элементов"""
+        tag_font = self.fonts.tag_font
         # Информация о файле
-        self.tag_config(
-            "info",
-            font=font.Font(
-                family=self.base_font.actual("family"),
-                size=self.base_font.actual("size") + 1,
-                weight="bold",
-                slant="italic",
-            ),
-            foreground="#4B0082",
-        )
-        self.tag_config(
-            "tag",
-            font=font.Font(
-                family=self.base_font.actual("family"),
-                size=self.base_font.actual("size") + 1,
-                weight="bold",
-                slant="italic",
-            ),
-            foreground="#3dba0b",
-        )
+        self.tag_config("info", font=tag_font("info"), foreground="#4B0082")
+        self.tag_config("tag", font=tag_font("tag"), foreground="#3dba0b")
         # Заголовки
-        self.tag_config(
-            "h1",
-            font=font.Font(
-                family=self.base_font.actual("family"),
-                size=self.base_font.actual("size") + 6,
-                weight="bold",
-            ),
-            foreground="#2b6cb0",
-        )
-        self.tag_config(
-            "h2",
-            font=font.Font(
-                family=self.base_font.actual("family"),
-                size=self.base_font.actual("size") + 4,
-                weight="bold",
-            ),
-            foreground="#2c5282",
-        )
-        self.tag_config(
-            "h3",
-            font=font.Font(
-                family=self.base_font.actual("family"),
-                size=self.base_font.actual("size") + 2,
-                weight="bold",
-            ),
-            foreground="#3182ce",
-        )
-        self.tag_config(
-            "h4",
-            font=font.Font(
-                family=self.base_font.actual("family"),
-                size=self.base_font.actual("size"),
-                weight="bold",
-            ),
-            foreground="#3182ce",
-        )
-        self.tag_config(
-            "h5",
-            font=font.Font(
-                family=self.base_font.actual("family"),
-                size=self.base_font.actual("size") - 1,
-                weight="bold",
-            ),
-            foreground="#3182ce",
-        )
+        self.tag_config("h1", font=tag_font("h1"), foreground="#2b6cb0")
+        self.tag_config("h2", font=tag_font("h2"), foreground="#2c5282")
+        self.tag_config("h3", font=tag_font("h3"), foreground="#3182ce")
+        self.tag_config("h4", font=tag_font("h4"), foreground="#3182ce")
+        self.tag_config("h5", font=tag_font("h5"), foreground="#3182ce")
         # Форматирование текста
-        self.tag_config(
-            "bold",
-            font=font.Font(
-                family=self.base_font.actual("family"),
-                size=self.base_font.actual("size"),
-                weight="bold",
-            ),
-        )
-        self.tag_config(
-            "italic",
-            font=font.Font(
-                family=self.base_font.actual("family"),
-                size=self.base_font.actual("size"),
-                slant="italic",
-            ),
-        )
-        self.tag_config(
-            "bold_italic",
-            font=font.Font(
-                family=self.base_font.actual("family"),
-                size=self.base_font.actual("size"),
-                weight="bold",
-                slant="italic",
-            ),
-        )
+        self.tag_config("bold", font=tag_font("bold"))
+        self.tag_config("italic", font=tag_font("italic"))
+        self.tag_config("bold_italic", font=tag_font("bold_italic"))
         # Код и ссылки
+        self.tag_config("code", font=self.fonts.code_font, background="#f0f0f0")
         self.tag_config(
-            "code",
-            font=("Courier", self.base_font.actual("size")),
-            background="#f0f0f0",
-        )
-        self.tag_config(
-            "link",
-            font=font.Font(
-                family=self.base_font.actual("family"),
-                size=self.base_font.actual("size"),
-                weight="normal",
-            ),
-            foreground="#4299e1",
-            underline=True,
+            "link", font=tag_font("link"), foreground="#4299e1", underline=True
         )
         # Списки
-        self.tag_config(
-            "list",
-            font=font.Font(
-                family=self.base_font.actual("family"),
-                size=self.base_font.actual("size"),
-                weight="normal",
-            ),
-            lmargin2=20,
-            spacing1=5,
-        )
+        self.tag_config("list", font=tag_font("list"), lmargin2=20, spacing1=5)
+
+    def line_count(self):
+        return self.document.line_count()
+
+    def pixel_offset(self, index):
+        """Высота текста от начала до index в пикселях
+
+        Берётся из кэша высот строк Tk (count -ypixels) и не требует пересчёта
+        раскладки, в отличие от bbox и dlineinfo.
+        """
+        return int(self.tk.call(self._w, "count", "-ypixels", "1.0", index))
 
     def highlight_markdown(self, event=None):
         """Подсветка Markdown-синтаксиса"""
-        # Очистка всех тегов перед повторной обработкой
-        for tag in self.tag_names():
-            if tag in (
-                "info",
-                "tag",
-                "h1",
-                "h2",
-                "h3",
-                "h4",
-                "h5",
-                "bold",
-                "italic",
-                "bold_italic",
-                "code",
-                "link",
-                "list",
-            ):
-                self.tag_remove(tag, "1.0", tk.END)
-
-        text = self.get("1.0", tk.END)
-        lines = text.split("\n")
-
-        # Обрабатываем построчно для многострочных паттернов
-        for i, line in enumerate(lines, 1):
-            line_start = f"{i}.0"
-            line_end = f"{i}.end"
-
-            # Заголовки
-            if re.match(r"^%\s", line):
-                self.tag_add("info", line_start, line_end)
-            elif re.match(r"^#\s", line):
-                self.tag_add("h1", line_start, line_end)
-            elif re.match(r"^##\s", line):
-                self.tag_add("h2", line_start, line_end)
-            elif re.match(r"^###\s", line):
-                self.tag_add("h3", line_start, line_end)
-            elif re.match(r"^####\s", line):
-                self.tag_add("h4", line_start, line_end)
-            elif re.match(r"^#####\s", line):
-                self.tag_add("h5", line_start, line_end)
-
-            # Списки
-            if re.match(r"^[\*\-\+]\s", line):
-                self.tag_add("list", line_start, line_end)
-
-        # Обрабатываем встроенные элементы (не зависящие от строк)
-        self.highlight_pattern(r"\*\*\*(.+?)\*\*\*", "bold_italic")
-        self.highlight_pattern(r"#([a-zA-Zа-яА-ЯёЁ_-]+?\s)", "tag")
-        self.highlight_pattern(r"\*\*(.+?)\*\*", "bold", exclude_tags=["bold_italic"])
-        self.highlight_pattern(
-            r"\*(.+?)\*", "italic", exclude_tags=["bold", "bold_italic"]
+        for tag in MARKDOWN_TAGS:
+            self.tag_remove(tag, "1.0", tk.END)
+        self.highlighted_lines.clear()
+        self.dirty_lines.clear()
+        self.lazy_highlight = self.line_count() > LAZY_HIGHLIGHT_MIN_LINES
+
+        # Видимая область сразу, остальное — в фоне. В ленивом режиме фон только
+        # заполняет кэш спанов, а строки размечаются по прокрутке
+        self.highlight_visible()
+        self.start_background_highlight()
+
+    def highlight_visible(self):
+        """Досвечивает ещё не подсвеченные строки видимой области с запасом"""
+        first = int(self.index("@0,0").split(".")[0])
+        last = int(self.index(f"@0,{self.winfo_height()}").split(".")[0])
+        first = max(1, first - LAZY_HIGHLIGHT_MARGIN)
+        last = min(self.line_count(), last + LAZY_HIGHLIGHT_MARGIN)
+
+        for start, end in self.highlighted_lines.missing(first, last):
+            self.highlight_lines(start, end)
+
+    def start_background_highlight(self):
+        """Токенизирует снимок текста в потоке и применяет спаны по частям
+
+        Большой документ (lazy_highlight) поток тоже токенизирует, но теги не
+        ставятся: спаны остаются в кэше, и highlight_visible досвечивает из
+        него строки при прокрутке, не токенизируя их в потоке Tk.
+        """
+        self._highlight_job += 1
+        self._background_results.clear()
+        if self._background_retry:
+            self.after_cancel(self._background_retry)
+            self._background_retry = None
+        if not self.highlighted_lines.missing(1, self.line_count()):
+            return
+
+        job = self._highlight_job
+        revision = self.revision
+        lines = self.document.lines()
+        worker = threading.Thread(
+            target=self._tokenize_in_background,
+            args=(job, revision, lines),
+            daemon=True,
         )
-        self.highlight_pattern(r"`(.+?)`", "code")
-        self.highlight_pattern(r"\[(.+?)\]\((.+?)\)", "link")
+        worker.start()
+        self.after(BACKGROUND_POLL_MS, self._poll_background_highlight, job)
+
+    def _tokenize_in_background(self, job, revision, lines):
+        # Выполняется в рабочем потоке: к Tk здесь обращаться нельзя
+        tokenize_line = self.token_cache.tokenize_line
+        line_spans = []
+        for start in range(0, len(lines), BACKGROUND_CHUNK_LINES):
+            if job != self._highlight_job:
+                # Запущено новое задание: этот снимок больше не нужен
+                return
+            chunk = lines[start : start + BACKGROUND_CHUNK_LINES]
+            line_spans.extend(tokenize_line(line) for line in chunk)
+        if job == self._highlight_job:
+            self._background_results[job] = (revision, lines, line_spans)
+
+    def _poll_background_highlight(self, job):
+        if job != self._highlight_job:
+            return
+        result = self._background_results.pop(job, None)
+        if result is None:
+            self.after(BACKGROUND_POLL_MS, self._poll_background_highlight, job)
+            return
+        if self.lazy_highlight:
+            # Разметка всей большой книги тегами — то, чего избегает ленивый режим
+            return
+        revision, lines, line_spans = result
+        self._apply_background_chunk(job, revision, lines, line_spans, 1)
+
+    def _apply_background_chunk(self, job, revision, lines, line_spans, next_line):
+        if job != self._highlight_job:
+            return
+        if revision != self.revision:
+            # Текст изменился: снимок устарел, повторяем после паузы в правках
+            self._background_retry = self.after(
+                BACKGROUND_RETRY_MS, self.start_background_highlight
+            )
+            return
+
+        total = len(line_spans)
+        deadline = time.perf_counter() + BACKGROUND_CHUNK_BUDGET
+        while next_line <= total and time.perf_counter() < deadline:
+            chunk_end = min(next_line + BACKGROUND_CHUNK_LINES - 1, total)
+            for first, last in self.highlighted_lines.missing(next_line, chunk_end):
+                ranges = {}
+                for i in range(first, last + 1):
+                    self._collect_spans(ranges, i, lines[i - 1], line_spans[i - 1])
+                self.apply_ranges(ranges)
+                self.highlighted_lines.add(first, last)
+            next_line = chunk_end + 1
+
+        if next_line <= total:
+            self.after_idle(
+                self._apply_background_chunk,
+                job,
+                revision,
+                lines,
+                line_spans,
+                next_line,
+            )
 
     def on_text_modified(self, event=None):
         if not self.edit_modified():
             return
 
         self.edit_modified(False)
+        self.highlight_dirty_lines()
 
-        line = int(self.index("insert").split(".")[0])
-        last = int(self.index("end-1c").split(".")[0])
-
-        for ln in (line - 2, line, line + 2):
-            if 1 <= ln <= last:
-                self.highlight_line(ln)
+    def highlight_dirty_lines(self):
+        """Повторная подсветка только изменённых строк"""
+        ranges = list(self.dirty_lines)
+        self.dirty_lines.clear()
+        for first, last in ranges:
+            self.highlight_lines(first, last)
 
-    def highlight_line(self, line_number):
-        # Обрабатываем построчно для многострочных паттернов
-        line_start = f"{line_number}.0"
-        line_end = f"{line_number}.end"
-        text = self.get(line_start, line_end)
+    def highlight_lines(self, first, last):
+        """Подсветка диапазона строк [first, last]"""
+        line_start = f"{first}.0"
+        line_end = f"{last}.end"
 
         # Очистка всех тегов перед повторной обработкой
-        for tag in self.tag_names():
-            if tag in (
-                "info",
-                "tag",
-                "h1",
-                "h2",
-                "h3",
-                "h4",
-                "h5",
-                "bold",
-                "italic",
-                "bold_italic",
-                "code",
-                "link",
-                "list",
-            ):
-                self.tag_remove(tag, line_start, line_end)
-
-        # Заголовки
-        if re.match(r"^%\s", text):
-            self.tag_add("info", line_start, line_end)
-        elif re.match(r"^#\s", text):
-            self.tag_add("h1", line_start, line_end)
-        elif re.match(r"^##\s", text):
-            self.tag_add("h2", line_start, line_end)
-        elif re.match(r"^###\s", text):
-            self.tag_add("h3", line_start, line_end)
-        elif re.match(r"^####\s", text):
-            self.tag_add("h4", line_start, line_end)
-        elif re.match(r"^#####\s", text):
-            self.tag_add("h5", line_start, line_end)
-
-        # Списки
-        if re.match(r"^[\*\-\+]\s", text):
-            self.tag_add("list", line_start, line_end)
-
-        # Обрабатываем встроенные элементы (не зависящие от строк)
-        self.highlight_pattern(
-            r"\*\*\*(.+?)\*\*\*", "bold_italic", line_start, line_end
-        )
-        self.highlight_pattern(
-            r"\*\*(.+?)\*\*",
-            "bold",
-            line_start,
-            line_end,
-            exclude_tags=["bold_italic"],
-        )
-        self.highlight_pattern(
-            r"\*(.+?)\*",
-            "italic",
-            line_start,
-            line_end,
-            exclude_tags=["bold", "bold_italic"],
-        )
-        self.highlight_pattern(r"#([a-zA-Zа-яА-ЯёЁ_-]+?\s)", "tag")
-        self.highlight_pattern(r"`(.+?)`", "code", line_start, line_end)
-        self.highlight_pattern(r"\[(.+?)\]\((.+?)\)", "link", line_start, line_end)
-
-    def highlight_pattern(
-        self, pattern, tag, start="1.0", end="end", exclude_tags=None
-    ):
-        """Подсветка без перекрытия с другими тегами"""
-        if exclude_tags is None:
-            exclude_tags = []
-
-        start = self.index(start)
-        end = self.index(end)
-        self.mark_set("matchStart", start)
-        self.mark_set("matchEnd", start)
-        self.mark_set("searchLimit", end)
-
-        count = tk.IntVar()
-        while True:
-            index = self.search(
-                pattern,
-                index="matchEnd",
-                stopindex="searchLimit",
-                count=count,
-                regexp=True,
+        for tag in MARKDOWN_TAGS:
+            self.tag_remove(tag, line_start, line_end)
+
+        ranges = {}
+        for i, line in enumerate(self.document.lines(first, last), first):
+            self._collect_spans(ranges, i, line, self.token_cache.tokenize_line(line))
+        self.apply_ranges(ranges)
+        self.highlighted_lines.add(first, last)
+
+    def _collect_spans(self, ranges, line_number, line, spans):
+        """Добавляет индексы спанов строки в словарь tag -> [start, end, ...]"""
+        if self.wide_chars and NON_BMP_CHARS.search(line):
+            spans = [
+                (tag, tk_column(line, start), tk_column(line, end))
+                for tag, start, end in spans
+            ]
+        for tag, start, end in spans:
+            ranges.setdefault(tag, []).extend(
+                (f"{line_number}.{start}", f"{line_number}.{end}")
             )
-            if index == "":
-                break
-            if count.get() == 0:
-                break
-
-            match_start = index
-            match_end = f"{index}+{count.get()}c"
-
-            # Проверяем, есть ли запрещённые теги
-            overlap = False
-            for t in exclude_tags:
-                if self.tag_ranges(t):  # Есть ли теги вообще
-                    ranges = self.tag_ranges(t)
-                    for i in range(0, len(ranges), 2):
-                        if self.compare(match_start, ">=", ranges[i]) and self.compare(
-                            match_start, "<", ranges[i + 1]
-                        ):
-                            overlap = True
-                            break
-                if overlap:
-                    break
-
-            if not overlap:
-                self.tag_add(tag, match_start, match_end)
-
-            self.mark_set("matchEnd", match_end)
+
+    def apply_ranges(self, ranges):
+        """Применяет собранные диапазоны пакетными вызовами tag_add"""
+        for tag, indices in ranges.items():
+            for i in range(0, len(indices), TAG_ADD_CHUNK * 2):
+                self.tag_add(tag, *indices[i : i + TAG_ADD_CHUNK * 2])
 
     def format_line(self, style):
         """Применяет форматирование к строке с курсором"""
@@ -408,7 +591,7 @@ class MarkdownText(tk.Text):
         line_start = f"{line_num}.0"
         line_end = f"{line_num}.end"
 
-        text = self.get(line_start, line_end)
+        text = self.document.line(int(line_num))
 
         if style == "bold":
             # Если уже есть **, убираем
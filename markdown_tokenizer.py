@@ -0,0 +1,197 @@
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+# Теги подсветки в порядке их применения
+MARKDOWN_TAGS = (
+    "info",
+    "tag",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "bold",
+    "italic",
+    "bold_italic",
+    "code",
+    "link",
+    "list",
+)
+
+HEADING_RE = re.compile(r"^(%|#{1,5})\s")
+LIST_RE = re.compile(r"^[\*\-\+]\s")
+BOLD_ITALIC_RE = re.compile(r"\*\*\*(.+?)\*\*\*")
+TAG_RE = re.compile(r"#([a-zA-Zа-яА-ЯёЁ_-]+?\s)")
+BOLD_RE = re.compile(r"\*\*(.+?)\*\*")
+ITALIC_RE = re.compile(r"\*(.+?)\*")
+CODE_RE = re.compile(r"`(.+?)`")
+LINK_RE = re.compile(r"\[(.+?)\]\((.+?)\)")
+
+
+class SpanIndex:
+    """Отсортированный индекс полуинтервалов [start, end) с поиском через bisect
+
+    Пересекающиеся спаны сливаются, поэтому позиции могут быть любыми
+    сравнимыми значениями: смещениями или кортежами (строка, столбец).
+    """
+
+    def __init__(self, spans=()):
+        self.starts = []
+        self.ends = []
+        self.extend(spans)
+
+    def add(self, start, end):
+        lo = bisect_left(self.ends, start)
+        hi = bisect_right(self.starts, end)
+        if lo < hi:
+            start = min(start, self.starts[lo])
+            end = max(end, self.ends[hi - 1])
+        self.starts[lo:hi] = [start]
+        self.ends[lo:hi] = [end]
+
+    def extend(self, spans):
+        for start, end in spans:
+            self.add(start, end)
+
+    def contains(self, pos):
+        i = bisect_right(self.starts, pos) - 1
+        return i >= 0 and pos < self.ends[i]
+
+
+def _find(pattern, line, exclude=None):
+    """Находит совпадения, начало которых не попадает в индекс exclude"""
+    found = []
+    for match in pattern.finditer(line):
+        start = match.start()
+        if exclude is not None and exclude.contains(start):
+            continue
+        found.append((start, match.end()))
+    return found
+
+
+def tokenize_line(line):
+    """Возвращает спаны (tag, start, end) для одной строки без перевода строки"""
+    spans = []
+    length = len(line)
+
+    # Заголовки и информация о файле
+    match = HEADING_RE.match(line)
+    if match:
+        marker = match.group(1)
+        tag = "info" if marker == "%" else f"h{len(marker)}"
+        spans.append((tag, 0, length))
+
+    # Списки
+    if LIST_RE.match(line):
+        spans.append(("list", 0, length))
+
+    # Встроенные элементы: быстрые проверки экономят regex-проходы
+    if "*" in line:
+        excluded = SpanIndex()
+        bold_italic = _find(BOLD_ITALIC_RE, line)
+        excluded.extend(bold_italic)
+        bold = _find(BOLD_RE, line, excluded)
+        excluded.extend(bold)
+        italic = _find(ITALIC_RE, line, excluded)
+        spans.extend(("bold_italic", s, e) for s, e in bold_italic)
+        spans.extend(("bold", s, e) for s, e in bold)
+        spans.extend(("italic", s, e) for s, e in italic)
+
+    if "#" in line:
+        # \s в конце тега может совпасть с переводом строки
+        for s, e in _find(TAG_RE, line + "\n"):
+            spans.append(("tag", s, min(e, length)))
+
+    if "`" in line:
+        spans.extend(("code", s, e) for s, e in _find(CODE_RE, line))
+
+    if "[" in line:
+        spans.extend(("link", s, e) for s, e in _find(LINK_RE, line))
+
+    return spans
+
+
+class LineTokenCache:
+    """LRU-кэш спанов строки по её содержимому
+
+    Ключом служит сама строка: словарь хэширует содержимое, а сравнение
+    строк исключает ложные попадания при коллизии хэшей. Кэш используется
+    и из потока фоновой подсветки, поэтому доступ защищён блокировкой.
+    """
+
+    def __init__(self, maxsize=100_000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def tokenize_line(self, line):
+        with self._lock:
+            spans = self._data.get(line)
+            if spans is not None:
+                self._data.move_to_end(line)
+                self.hits += 1
+                return spans
+            self.misses += 1
+
+        spans = tuple(tokenize_line(line))
+
+        with self._lock:
+            self._data[line] = spans
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return spans
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """Счётчики для подбора размера кэша: (hits, misses, size, maxsize)"""
+        with self._lock:
+            return self.hits, self.misses, len(self._data), self.maxsize
+
+
+def tokenize(text):
+    """Возвращает спаны (tag, start_offset, end_offset) для всего текста"""
+    spans = []
+    offset = 0
+    for line in text.split("\n"):
+        for tag, start, end in tokenize_line(line):
+            spans.append((tag, offset + start, offset + end))
+        offset += len(line) + 1
+    return spans
+
+
+def benchmark(paths, repeat=5):
+    """Замеряет скорость токенизатора на указанных файлах"""
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            spans = tokenize(text)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        mb_per_s = len(text.encode("utf-8")) / best / 1_000_000
+        print(
+            f"{path}: {len(spans)} спанов, {best * 1000:.1f} мс, {mb_per_s:.1f} МБ/с"
+        )
+
+
+if __name__ == "__main__":
+    benchmark(sys.argv[1:])
@@ -0,0 +1,333 @@
+import difflib
+import math
+from bisect import bisect_right
+
+from heading_index import parse_heading
+
+# Ширина полосы вокруг диагонали, в которой ищется выравнивание абзацев
+ALIGN_BAND = 15
+# Штраф за абзац без пары и за слияние двух абзацев в один
+SKIP_COST = 2.0
+MERGE_COST = 2.0
+# Ожидаемое отношение длины перевода к длине оригинала
+LENGTH_RATIO = 1.0
+# Длинный отрезок без якорей выравнивается окнами по столько абзацев;
+# конец окна пересчитывается в следующем окне
+SECTION_WINDOW = 400
+WINDOW_MARGIN = 50
+# Предел n*m для сопоставления различающихся последовательностей заголовков
+ANCHOR_MATCH_LIMIT = 1_000_000
+
+
+def split_units(lines):
+    """Абзацы вместе с пустыми строками после них
+
+    Каждый абзац — [первая строка, число строк, символов, уровень заголовка].
+    Заголовок всегда образует отдельный абзац.
+    """
+    units = []
+    open_unit = False
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            if units:
+                units[-1][1] += 1
+            else:
+                units.append([number, 1, 0, 0])
+            open_unit = False
+            continue
+
+        heading = parse_heading(line)
+        if open_unit and not heading and not units[-1][3]:
+            units[-1][1] += 1
+            units[-1][2] += len(line)
+        else:
+            units.append([number, 1, len(line), heading[0] if heading else 0])
+        open_unit = True
+    return units
+
+
+def match_headings(left_levels, right_levels):
+    """Пары позиций заголовков, служащих якорями выравнивания"""
+    n, m = len(left_levels), len(right_levels)
+    head = 0
+    while head < min(n, m) and left_levels[head] == right_levels[head]:
+        head += 1
+    tail = 0
+    while (
+        tail < min(n, m) - head
+        and left_levels[n - 1 - tail] == right_levels[m - 1 - tail]
+    ):
+        tail += 1
+
+    pairs = [(k, k) for k in range(head)]
+    left_middle = left_levels[head : n - tail]
+    right_middle = right_levels[head : m - tail]
+    if len(left_middle) * len(right_middle) <= ANCHOR_MATCH_LIMIT:
+        matcher = difflib.SequenceMatcher(
+            None, left_middle, right_middle, autojunk=False
+        )
+        for a, b, size in matcher.get_matching_blocks():
+            pairs.extend((head + a + k, head + b + k) for k in range(size))
+    pairs.extend((n - tail + k, m - tail + k) for k in range(tail))
+    return pairs
+
+
+def align_section(left, right):
+    """Выравнивает длины абзацев динамическим программированием
+
+    Возвращает шаги (сколько абзацев слева, сколько справа): пара 1:1,
+    абзац без пары 1:0 или 0:1, слияние 2:1 или 1:2. Перебираются только
+    клетки в полосе вокруг диагонали, поэтому время почти линейно.
+    """
+    n, m = len(left), len(right)
+    if not n or not m:
+        return [(1, 0)] * n + [(0, 1)] * m
+
+    # Логарифмы длин одного и двух последних абзацев перед позицией:
+    # цена пары — модуль разности логарифмов
+    log = math.log
+    left_one = [0.0] + [log(size * LENGTH_RATIO + 1) for size in left]
+    left_two = [0.0, 0.0] + [
+        log((a + b) * LENGTH_RATIO + 1) for a, b in zip(left, left[1:])
+    ]
+    right_one = [0.0] + [log(size + 1) for size in right]
+    right_two = [0.0, 0.0] + [log(a + b + 1) for a, b in zip(right, right[1:])]
+
+    # Строка i таблицы — клетки полосы j = starts[i]..; нет пути — inf
+    inf = math.inf
+    starts = []
+    costs = []
+    backs = []
+
+    def shifted(i, lo, width, dj):
+        """Строка i как цены клеток (i, j - dj) для j = lo.., inf вне полосы"""
+        if i < 0:
+            return [inf] * width
+        offset = lo - dj - starts[i]
+        row = costs[i]
+        values = row[max(offset, 0) : max(offset + width, 0)]
+        values = [inf] * min(max(-offset, 0), width) + values
+        return values + [inf] * (width - len(values))
+
+    for i in range(n + 1):
+        lo = max(0, math.floor((i - 1) * m / n) - ALIGN_BAND)
+        hi = min(m, math.ceil(i * m / n) + ALIGN_BAND)
+        width = hi - lo + 1
+        pair = shifted(i - 1, lo, width, 1)
+        skip = shifted(i - 1, lo, width, 0)
+        merge_left = shifted(i - 2, lo, width, 1)
+        merge_right = shifted(i - 1, lo, width, 2)
+        one = left_one[i]
+        two = left_two[i]
+        row = [inf] * width
+        back = [None] * width
+        for k in range(width):
+            j = lo + k
+            if not i and not j:
+                row[k] = 0.0
+                continue
+            best = pair[k] + abs(right_one[j] - one)
+            move = (1, 1)
+            value = skip[k] + SKIP_COST
+            if value < best:
+                best, move = value, (1, 0)
+            if k:
+                value = row[k - 1] + SKIP_COST
+                if value < best:
+                    best, move = value, (0, 1)
+            value = merge_left[k] + abs(right_one[j] - two) + MERGE_COST
+            if value < best:
+                best, move = value, (2, 1)
+            value = merge_right[k] + abs(right_two[j] - one) + MERGE_COST
+            if value < best:
+                best, move = value, (1, 2)
+            if best < inf:
+                row[k] = best
+                back[k] = move
+        starts.append(lo)
+        costs.append(row)
+        backs.append(back)
+
+    moves = []
+    i, j = n, m
+    while i or j:
+        di, dj = backs[i][j - starts[i]]
+        moves.append((di, dj))
+        i -= di
+        j -= dj
+    moves.reverse()
+    return moves
+
+
+def align_windows(left, right, cache, used):
+    """Выравнивает длинный отрезок окнами по SECTION_WINDOW абзацев
+
+    Окно справа берётся в пропорции всего отрезка. Из выравнивания окна
+    принимаются шаги до точки разрыва за WINDOW_MARGIN и более абзацев до
+    конца окна, и следующее окно начинается с неё. Окна кэшируются по
+    длинам абзацев (в cache — прежние, в used — нужные сейчас). Точку
+    разрыва выбирают длины абзацев, а не их номера, так что после правки
+    выравнивание быстро сходится с прежним и следующие окна берутся из кэша.
+    """
+    moves = []
+    i = j = 0
+    n, m = len(left), len(right)
+    right_window = round(SECTION_WINDOW * m / n) if n else 0
+    while True:
+        if n - i <= SECTION_WINDOW or j == m:
+            window = (tuple(left[i:]), tuple(right[j:]))
+        else:
+            window = (
+                tuple(left[i : i + SECTION_WINDOW]),
+                tuple(right[j : j + right_window]),
+            )
+        window_moves = cache.get(window, used.get(window))
+        if window_moves is None:
+            window_moves = align_section(*window)
+        used[window] = window_moves
+        if len(window[0]) == n - i:
+            moves.extend(window_moves)
+            return moves
+
+        # Кандидаты в точки разрыва — начала шагов в последней трети окна
+        first_break = i + SECTION_WINDOW - 3 * WINDOW_MARGIN
+        last_break = i + SECTION_WINDOW - WINDOW_MARGIN
+        position = i
+        taken = 0
+        best = None
+        for count, (di, dj) in enumerate(window_moves):
+            if position > last_break:
+                break
+            if position >= first_break:
+                rank = hash((left[position - 1], left[position]))
+                if best is None or rank > best:
+                    best = rank
+                    taken = count
+            position += di
+        if best is None:
+            taken = len(window_moves)
+        for di, dj in window_moves[:taken]:
+            moves.append((di, dj))
+            i += di
+            j += dj
+
+
+class ParagraphAlignment:
+    """Соответствие строк оригинала и перевода
+
+    Тексты делятся на абзацы, заголовки одного уровня служат якорями, а
+    абзацы между якорями выравниваются по длине. Результат — отрезки строк
+    (слева, справа), отсортированные по началу, так что перевод строки
+    стоит O(log n). Выравнивание отрезка между якорями (длинного — по
+    окнам) кэшируется по длинам абзацев: после правки пересчитывается
+    только изменённое окно и, пока выравнивание не сойдётся, следующие.
+    """
+
+    def __init__(self):
+        self.left_firsts = []
+        self.left_counts = []
+        self.right_firsts = []
+        self.right_counts = []
+        self._sections = {}
+
+    def build(self, left_lines, right_lines):
+        """Считает отрезки, не меняя объект: можно звать из фонового потока"""
+        left = split_units(left_lines)
+        right = split_units(right_lines)
+
+        left_headings = [i for i, unit in enumerate(left) if unit[3]]
+        right_headings = [i for i, unit in enumerate(right) if unit[3]]
+        anchors = [
+            (left_headings[a], right_headings[b])
+            for a, b in match_headings(
+                [left[i][3] for i in left_headings],
+                [right[i][3] for i in right_headings],
+            )
+        ]
+        anchors.append((len(left), len(right)))
+
+        left_segments = ([], [])
+        right_segments = ([], [])
+        sections = {}
+        i = j = 0
+        for anchor_left, anchor_right in anchors:
+            moves = align_windows(
+                [unit[2] for unit in left[i:anchor_left]],
+                [unit[2] for unit in right[j:anchor_right]],
+                self._sections,
+                sections,
+            )
+
+            if anchor_left < len(left):
+                moves = moves + [(1, 1)]
+            for di, dj in moves:
+                _add_segment(left_segments, left, i, di, len(left_lines))
+                _add_segment(right_segments, right, j, dj, len(right_lines))
+                i += di
+                j += dj
+
+        return left_segments, right_segments, sections
+
+    def apply(self, result):
+        (left_firsts, left_counts), (right_firsts, right_counts), sections = result
+        self.left_firsts = left_firsts
+        self.left_counts = left_counts
+        self.right_firsts = right_firsts
+        self.right_counts = right_counts
+        # Храним только отрезки текущего текста
+        self._sections = sections
+
+    def edit_left(self, first, removed, added):
+        self._shift(self.left_firsts, self.left_counts, first, added - removed)
+
+    def edit_right(self, first, removed, added):
+        self._shift(self.right_firsts, self.right_counts, first, added - removed)
+
+    def _shift(self, firsts, counts, first, delta):
+        """Сдвигает отрезки после правки до следующего build()"""
+        if not delta or not firsts:
+            return
+        i = max(bisect_right(firsts, first) - 1, 0)
+        counts[i] = max(counts[i] + delta, 0)
+        for k in range(i + 1, len(firsts)):
+            firsts[k] = max(firsts[k] + delta, first + 1)
+
+    def left_to_right(self, line):
+        return self._map(
+            self.left_firsts,
+            self.left_counts,
+            self.right_firsts,
+            self.right_counts,
+            line,
+        )
+
+    def right_to_left(self, line):
+        return self._map(
+            self.right_firsts,
+            self.right_counts,
+            self.left_firsts,
+            self.left_counts,
+            line,
+        )
+
+    @staticmethod
+    def _map(src_firsts, src_counts, dst_firsts, dst_counts, line):
+        i = bisect_right(src_firsts, line) - 1
+        if i < 0:
+            return line
+        offset = line - src_firsts[i]
+        if not dst_counts[i]:
+            return max(dst_firsts[i], 1)
+        if offset >= src_counts[i]:
+            return dst_firsts[i] + dst_counts[i] - 1
+        return dst_firsts[i] + offset * dst_counts[i] // src_counts[i]
+
+
+def _add_segment(segments, units, start, size, total):
+    """Добавляет отрезок из size абзацев, начиная с абзаца start"""
+    firsts, counts = segments
+    if start < len(units):
+        firsts.append(units[start][0])
+    else:
+        firsts.append(total + 1)
+    counts.append(sum(unit[1] for unit in units[start : start + size]))
@@ -0,0 +1,215 @@
+import multiprocessing
+import re
+import time
+from collections import deque
+from functools import lru_cache
+
+# Бюджет времени одного поиска по умолчанию, секунды
+REGEX_TIME_BUDGET = 5.0
+# Порции совпадений, которые процесс отправляет редактору
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.05
+
+
+@lru_cache(maxsize=128)
+def compile_pattern(pattern, flags=0):
+    """Скомпилированное выражение: повторные поиски его не перекомпилируют"""
+    return re.compile(pattern, flags)
+
+
+def _serve(conn):
+    """Цикл дочернего процесса: выполняет задания по одному
+
+    Задание — (вид, выражение, флаги, параметры...): "search" ищет
+    совпадения, "replace" заменяет все, "expand" — одно совпадение.
+    """
+    text = ""
+    while True:
+        try:
+            job, new_text, request = conn.recv()
+        except EOFError:
+            return
+        if new_text is not None:
+            text = new_text
+        kind, pattern, flags, *args = request
+        try:
+            compiled = compile_pattern(pattern, flags)
+            if kind == "search":
+                _run(conn, job, text, compiled, *args)
+            elif kind == "replace":
+                conn.send((job, "replaced", _replace_all(text, compiled, *args)))
+            else:
+                conn.send((job, "expanded", _expand(compiled, *args)))
+        except (re.error, IndexError) as e:
+            # IndexError — ссылка на несуществующую группу в шаблоне замены
+            conn.send((job, "error", str(e)))
+
+
+def _run(conn, job, text, pattern, cursor):
+    """Отдаёт совпадения порциями: сначала от курсора до конца, затем с начала
+
+    Второй проход останавливается перед совпадением, которое заходит на
+    первое найденное от курсора: совпадения не перекрываются.
+    """
+    batch = []
+    flush_at = 0.0
+    # Второй проход идёт до курсора или до начала первого совпадения
+    limit = len(text)
+    passes = (pattern.finditer(text, cursor), pattern.finditer(text))
+    for number, matches in enumerate(passes):
+        for match in matches:
+            if not number:
+                limit = min(limit, match.start())
+            elif match.start() >= cursor or match.end() > limit:
+                break
+            batch.append(match.span())
+            # Первое совпадение отдаём сразу, дальше — порциями
+            if len(batch) >= BATCH_SIZE or time.monotonic() >= flush_at:
+                conn.send((job, "batch", batch))
+                batch = []
+                flush_at = time.monotonic() + FLUSH_INTERVAL
+    conn.send((job, "batch", batch))
+    conn.send((job, "done", None))
+
+
+def _replace_all(text, pattern, template):
+    """(число замен, начало, конец, новый текст) изменённого участка строк
+
+    Участок — целые строки от первого до последнего совпадения: за его
+    пределами текст не меняется. Если замена ничего не изменила, вместо
+    нового текста участка — None.
+    """
+    new_text, count = pattern.subn(template, text)
+    if new_text == text:
+        return count, 0, 0, None
+    # Границы участка отдельными проходами: подстановка шаблона функцией на
+    # каждое совпадение в разы медленнее встроенной
+    first_match = pattern.search(text)
+    last_match = deque(pattern.finditer(text, first_match.start()), maxlen=1)[0]
+    first = text.rfind("\n", 0, first_match.start()) + 1
+    last = text.find("\n", last_match.end())
+    if last == -1:
+        last = len(text)
+    return count, first, last, new_text[first : len(new_text) - (len(text) - last)]
+
+
+def _expand(pattern, text, template, start, end):
+    """Замена совпадения [start, end) в тексте или None, если его там нет"""
+    match = pattern.match(text, start)
+    if not match or match.end() != end:
+        return None
+    return match.expand(template)
+
+
+class RegexWorker:
+    """Поиск и замена регулярного выражения в процессе, который можно убить
+
+    Процесс переживает задания и помнит последний присланный текст, так что
+    новый запрос по тому же тексту передаёт только выражение. Задание, не
+    уложившееся в бюджет времени, прерывается вместе с процессом: даже
+    выражение с катастрофическим перебором не подвешивает редактор.
+    """
+
+    def __init__(self, time_budget=REGEX_TIME_BUDGET):
+        self.time_budget = time_budget
+        self.deadline = None
+        self._process = None
+        self._conn = None
+        self._text_key = None
+        self._job = 0
+        self._running = False
+
+    def start(self, text_key, get_text, pattern, flags, cursor=0):
+        """Начинает поиск; get_text() вызывается, только если text_key новый"""
+        self._submit(text_key, get_text, ("search", pattern, flags, cursor))
+
+    def start_replace(self, text_key, get_text, pattern, flags, template):
+        """Заменяет все совпадения по шаблону re; итог — сообщение "replaced"
+
+        Данные сообщения — (число замен, начало, конец, новый текст участка),
+        см. _replace_all.
+        """
+        self._submit(text_key, get_text, ("replace", pattern, flags, template))
+
+    def start_expand(self, text, pattern, flags, template, start, end):
+        """Замена одного совпадения [start, end) в коротком тексте text
+
+        Итог — сообщение "expanded" с текстом замены или None, если
+        совпадения на этом месте уже нет. Запомненный текст не меняется.
+        """
+        self._submit(None, None, ("expand", pattern, flags, text, template, start, end))
+
+    def _submit(self, text_key, get_text, request):
+        if self._running:
+            # Процесс занят прежним заданием, возможно бесконечным
+            self.kill()
+        self._ensure_process()
+
+        text = None
+        # text_key None — задание не читает запомненный текст
+        if text_key is not None and text_key != self._text_key:
+            text = get_text()
+            self._text_key = text_key
+        self._job += 1
+        self._running = True
+        self.deadline = time.monotonic() + self.time_budget
+        self._conn.send((self._job, text, request))
+
+    def poll(self):
+        """Сообщения текущего задания: [(вид, данные)]
+
+        Вид — "batch" (список (start, end)), "done", "replaced", "expanded",
+        "error" или "timeout".
+        """
+        if not self._running:
+            return []
+        messages = []
+        try:
+            while self._conn.poll():
+                job, kind, payload = self._conn.recv()
+                if job != self._job:
+                    continue
+                messages.append((kind, payload))
+                if kind in ("done", "replaced", "expanded", "error"):
+                    self._running = False
+                    return messages
+        except (EOFError, OSError):
+            self.kill()
+            messages.append(("error", "процесс поиска завершился"))
+            return messages
+
+        if time.monotonic() > self.deadline:
+            self.kill()
+            messages.append(("timeout", None))
+        return messages
+
+    def cancel(self):
+        """Бросает текущее задание: если оно ещё выполняется, убивает процесс"""
+        if self._running:
+            self.kill()
+
+    def kill(self):
+        self._running = False
+        if self._process is None:
+            return
+        self._process.kill()
+        self._process.join()
+        self._conn.close()
+        self._process = None
+        self._conn = None
+        self._text_key = None
+
+    def _ensure_process(self):
+        if self._process is not None:
+            if self._process.is_alive():
+                return
+            self.kill()
+        # spawn: дочерний процесс не наследует потоки и состояние Tk
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(
+            target=_serve, args=(child_conn,), daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+        self._text_key = None
@@ -1,17 +1,74 @@
 import re
 import tkinter as tk
+from bisect import bisect_right
+from itertools import accumulate
 from tkinter import ttk
 
 from dialog_manager import DialogManager
-from markdown_text import MarkdownText
+from markdown_text import MarkdownText, tk_column
+from regex_worker import RegexWorker, compile_pattern
+
+# Поиск по мере ввода: пауза после нажатия и опрос процесса поиска
+LIVE_DELAY_MS = 150
+LIVE_POLL_MS = 20
+# Сколько строк вокруг совпадения передавать процессу для одиночной замены
+REPLACE_CONTEXT_LINES = 2
+
+
+def _split_index(index):
+    line, col = index.split(".")
+    return int(line), int(col)
+
+
+class TextPositions:
+    """Переводит смещения символов в позиции Tk по таблице начал строк
+
+    Таблица строится один раз на поиск. Смещения совпадений идут по
+    возрастанию, поэтому поиск строки продолжается с предыдущей найденной.
+    wide_chars — символы вне BMP занимают в индексах Tk два столбца.
+    """
+
+    def __init__(self, lines, wide_chars=False):
+        self.lines = lines
+        self.starts = [0, *accumulate(len(line) + 1 for line in lines[:-1])]
+        self.line = 0
+        self.wide_chars = wide_chars
+
+    def position(self, offset):
+        lo = self.line if offset >= self.starts[self.line] else 0
+        self.line = bisect_right(self.starts, offset, lo) - 1
+        col = offset - self.starts[self.line]
+        if self.wide_chars:
+            col = tk_column(self.lines[self.line], col)
+        return f"{self.line + 1}.{col}"
 
 
 class SearchDialog:
-    def __init__(self, root, text_frame: MarkdownText):
+    def __init__(self, root, text_frame: MarkdownText, toc=None):
         self.text_frame = text_frame
+        # Оглавление панели: после замены заголовки могли измениться
+        self.toc = toc
         self.search_matches = []
         self.search_index = -1
 
+        # Поиск по мере ввода: номер текущего поиска отменяет устаревшие
+        self._live_generation = 0
+        self._live_job = None
+        self._live_query = None
+        self._live_positions = None
+        self._live_positions_revision = None
+        self._live_select_all = False
+        self._live_revision = None
+        # Регулярные выражения выполняются в процессе, который можно убить
+        self.regex_worker = RegexWorker()
+
+        text_frame.tag_config(
+            "search_highlight_all", background="#7CFC00", foreground="black"
+        )
+        text_frame.tag_config(
+            "search_highlight", background="green", foreground="black"
+        )
+
         search_win = tk.Toplevel(root)
         search_win.title("Поиск")
         search_win.transient(root)
@@ -44,9 +101,26 @@ class SearchDialog:
         )
         select_all_check.pack(side=tk.LEFT, padx=5, pady=5)
 
+        live_var = tk.BooleanVar(value=True)
+        live_check = tk.Checkbutton(search_win, text="Live", variable=live_var)
+        live_check.pack(side=tk.LEFT, padx=5, pady=5)
+
         self.search_started = False
 
+        def on_query_changed(event=None):
+            if live_var.get():
+                self.schedule_live_search(
+                    search_entry.get(), regex_var.get(), select_all_var.get()
+                )
+
+        def on_return():
+            if live_var.get() and self.search_started:
+                self.goto_next_match()
+            else:
+                start_search()
+
         def start_search():
+            self.cancel_live_search()
             self.search_started = True
             term = search_entry.get()
             if not term or not self.text_frame:
@@ -74,6 +148,29 @@ class SearchDialog:
         tk.Button(
             search_win, text="⬇️", command=next_match, font=("Noto Color Emoji", 10)
         ).pack(side=tk.LEFT, padx=2)
+
+        tk.Label(search_win, text="Заменить:").pack(side=tk.LEFT, padx=5, pady=5)
+        replace_entry = tk.Entry(search_win, width=20)
+        replace_entry.pack(side=tk.LEFT, padx=5, pady=5)
+
+        def replace_current():
+            term = search_entry.get()
+            if term:
+                self.replace_current(
+                    term, replace_entry.get(), regex_var.get(), select_all_var.get()
+                )
+
+        def replace_all():
+            term = search_entry.get()
+            if term:
+                self.replace_all(term, replace_entry.get(), regex_var.get())
+
+        tk.Button(search_win, text="Заменить", command=replace_current).pack(
+            side=tk.LEFT, padx=2
+        )
+        tk.Button(search_win, text="Все", command=replace_all).pack(
+            side=tk.LEFT, padx=2
+        )
         tk.Button(
             search_win,
             text="❌",
@@ -81,10 +178,21 @@ class SearchDialog:
             font=("Noto Color Emoji", 10),
         ).pack(side=tk.LEFT, padx=2)
 
-        search_entry.bind("<Return>", lambda e: start_search())
+        self.status_label = tk.Label(search_win, width=24, anchor="w")
+        self.status_label.pack(side=tk.LEFT, padx=5)
+
+        for check in (regex_check, select_all_check, live_check):
+            check.configure(command=on_query_changed)
+        search_entry.bind("<KeyRelease>", on_query_changed)
+        search_entry.bind("<<ComboboxSelected>>", on_query_changed)
+        search_entry.bind("<Return>", lambda e: on_return())
+        replace_entry.bind("<Return>", lambda e: replace_current())
         search_win.bind("<Escape>", lambda e: self.close_search(search_win))
+        search_win.protocol("WM_DELETE_WINDOW", lambda: self.close_search(search_win))
 
     def close_search(self, search_win):
+        self.cancel_live_search()
+        self.regex_worker.kill()
         self.text_frame.tag_remove("search_highlight", "1.0", tk.END)
         self.text_frame.tag_remove("search_highlight_all", "1.0", tk.END)
         search_win.destroy()
@@ -100,52 +208,37 @@ class SearchDialog:
         self.text_frame.tag_remove("search_highlight", "1.0", tk.END)
         self.text_frame.tag_add("search_highlight", start_pos, end_pos)
 
-    def index_to_text_pos(self, text, index):
-        """Преобразует позицию символа (int) в формат 'строка.символ' для Text"""
-        line = text.count("\n", 0, index) + 1
-        col = index - text.rfind("\n", 0, index) - 1
-        return f"{line}.{col}"
-
     def find_all_matches(self, widget, term, use_regex=False, select_all=False):
         widget.tag_remove("current_line", "1.0", tk.END)
-        self.search_matches.clear()
-        self.search_index = -1
-
-        text_content = widget.get("1.0", tk.END)
-
         if use_regex:
+            # Выражение ищет отдельный процесс с бюджетом времени, результаты
+            # приходят порциями, как при поиске по мере ввода
             try:
-                for match in re.finditer(term, text_content, flags=re.IGNORECASE):
-                    start_index = self.index_to_text_pos(text_content, match.start())
-                    end_index = self.index_to_text_pos(text_content, match.end())
-                    if select_all:
-                        widget.tag_add("search_highlight_all", start_index, end_index)
-                    else:
-                        widget.tag_remove("search_highlight_all", "1.0", tk.END)
-                    self.search_matches.append([start_index, end_index])
+                compile_pattern(term, re.IGNORECASE)
             except re.error as e:
                 DialogManager.show_dialog("Ошибка RegEx", str(e))
                 return
-        else:
-            start_pos = "1.0"
-            while True:
-                start_pos = widget.search(
-                    term, start_pos, nocase=True, stopindex=tk.END
-                )
-                if not start_pos:
-                    break
-                end_pos = f"{start_pos}+{len(term)}c"
-                if select_all:
-                    widget.tag_add("search_highlight_all", start_pos, end_pos)
-                else:
-                    widget.tag_remove("search_highlight_all", "1.0", tk.END)
-                self.search_matches.append([start_pos, end_pos])
-                start_pos = end_pos
-
-        widget.tag_config(
-            "search_highlight_all", background="#7CFC00", foreground="black"
-        )
-        widget.tag_config("search_highlight", background="green", foreground="black")
+            self.start_live_search(term, True, select_all)
+            return
+
+        widget.tag_remove("search_highlight_all", "1.0", tk.END)
+        self.search_matches.clear()
+        self.search_index = -1
+
+        start_pos = "1.0"
+        while True:
+            start_pos = widget.search(term, start_pos, nocase=True, stopindex=tk.END)
+            if not start_pos:
+                break
+            end_pos = widget.index(f"{start_pos}+{widget.tk_length(term)}c")
+            self.search_matches.append([start_pos, end_pos])
+            start_pos = end_pos
+
+        # Все совпадения подсвечиваем пакетными вызовами tag_add
+        if select_all:
+            indices = [index for match in self.search_matches for index in match]
+            widget.apply_ranges({"search_highlight_all": indices})
+        self.status_label.config(text=f"{len(self.search_matches)} совп.")
 
     def goto_next_match(self):
         if not self.search_matches:
@@ -157,3 +250,298 @@ class SearchDialog:
         self.text_frame.mark_set("insert", start_pos)
         self.text_frame.tag_remove("search_highlight", "1.0", tk.END)
         self.text_frame.tag_add("search_highlight", start_pos, end_pos)
+
+    def schedule_live_search(self, term, use_regex, select_all):
+        """Запускает поиск после паузы во вводе, если запрос изменился"""
+        query = (term, use_regex, select_all)
+        if query == self._live_query:
+            return
+        self._live_query = query
+        if self._live_job:
+            self.text_frame.after_cancel(self._live_job)
+        self._live_job = self.text_frame.after(
+            LIVE_DELAY_MS, self.start_live_search, *query
+        )
+
+    def cancel_live_search(self):
+        self._live_generation += 1
+        # Брошенное задание иначе работало бы до конца, ведь опрос прекращён
+        self.regex_worker.cancel()
+        self._live_query = None
+        if self._live_job:
+            self.text_frame.after_cancel(self._live_job)
+            self._live_job = None
+
+    def start_live_search(self, term, use_regex, select_all):
+        """Ищет в снимке текста в отдельном процессе, начиная от курсора"""
+        self._live_job = None
+        self._live_generation += 1
+        self.regex_worker.cancel()
+        self._live_query = (term, use_regex, select_all)
+        generation = self._live_generation
+
+        widget = self.text_frame
+        widget.tag_remove("search_highlight", "1.0", tk.END)
+        widget.tag_remove("search_highlight_all", "1.0", tk.END)
+        self.search_matches.clear()
+        self.search_index = -1
+        self.search_started = True
+        if not term:
+            self.status_label.config(text="")
+            return
+
+        pattern = term if use_regex else re.escape(term)
+        try:
+            compile_pattern(pattern, re.IGNORECASE)
+        except re.error:
+            # Недописанное выражение — обычное дело при вводе, без диалога
+            self.status_label.config(text="Ошибка RegEx")
+            return
+
+        cursor = widget.document.offset(*widget.document_position("insert"))
+
+        # Таблица строк и текст в процессе поиска обновляются только после правок
+        lines = None
+        if self._live_positions_revision != widget.revision:
+            lines = widget.document.lines()
+            self._live_positions = TextPositions(lines, widget.wide_chars)
+            self._live_positions_revision = widget.revision
+
+        def get_text():
+            return "\n".join(lines or widget.document.lines())
+
+        self._live_select_all = select_all
+        self._live_revision = widget.revision
+        self.status_label.config(text="Поиск…")
+        self.regex_worker.start(
+            (id(widget), widget.revision), get_text, pattern, re.IGNORECASE, cursor
+        )
+        widget.after(LIVE_POLL_MS, self._poll_live_search, generation)
+
+    def _poll_live_search(self, generation):
+        if generation != self._live_generation:
+            return
+        if self.text_frame.revision != self._live_revision:
+            # Текст изменился: результаты снимка устарели, ищем заново
+            self.regex_worker.cancel()
+            query = self._live_query
+            self._live_query = None
+            if query:
+                self.schedule_live_search(*query)
+            return
+
+        count = len(self.search_matches)
+        for kind, payload in self.regex_worker.poll():
+            if kind == "batch":
+                self._add_live_matches(payload)
+                count = len(self.search_matches)
+            elif kind == "done":
+                self.status_label.config(text=f"{count} совп.")
+                return
+            elif kind == "error":
+                self.status_label.config(text=f"Ошибка: {payload}")
+                return
+            elif kind == "timeout":
+                budget = self.regex_worker.time_budget
+                self.status_label.config(text=f"{count} совп., прервано ({budget} с)")
+                DialogManager.show_dialog(
+                    "Поиск прерван",
+                    f"Выражение не уложилось в {budget} с,\n"
+                    f"показаны найденные совпадения: {count}",
+                    timeout=3000,
+                )
+                return
+
+        self.status_label.config(text=f"{count} совп.…")
+        self.text_frame.after(LIVE_POLL_MS, self._poll_live_search, generation)
+
+    def _add_live_matches(self, batch):
+        positions = self._live_positions
+        matches = [[positions.position(s), positions.position(e)] for s, e in batch]
+        self.search_matches.extend(matches)
+        if self._live_select_all and matches:
+            indices = [index for match in matches for index in match]
+            self.text_frame.apply_ranges({"search_highlight_all": indices})
+        # Ближайшее к курсору совпадение показываем, не дожидаясь конца поиска
+        if self.search_index == -1 and self.search_matches:
+            self.goto_next_match()
+
+    def _replacement_pattern(self, term, replacement, use_regex):
+        """Выражение и шаблон замены для процесса поиска
+
+        В обычном режиме экранируются оба: шаблон re подставляется как есть.
+        """
+        pattern = term if use_regex else re.escape(term)
+        try:
+            compile_pattern(pattern, re.IGNORECASE)
+        except re.error as e:
+            DialogManager.show_dialog("Ошибка RegEx", str(e))
+            return None, None
+        if not use_regex:
+            replacement = replacement.replace("\\", "\\\\")
+        return pattern, replacement
+
+    def replace_current(self, term, replacement, use_regex, select_all):
+        """Заменяет текущее совпадение и переходит к следующему
+
+        Совпадение проверяется и разворачивается в процессе поиска по
+        нескольким строкам вокруг него, без копии всего текста.
+        """
+        if self.search_index == -1:
+            # Первое нажатие показывает совпадение, второе его заменяет
+            self.goto_next_match()
+            return
+        pattern, template = self._replacement_pattern(term, replacement, use_regex)
+        if pattern is None:
+            return
+
+        widget = self.text_frame
+        document = widget.document
+        start, end = self.search_matches[self.search_index]
+        start_line, start_col = widget.document_position(start)
+        end_line, end_col = widget.document_position(end)
+        first = max(1, start_line - REPLACE_CONTEXT_LINES)
+        last = min(document.line_count(), end_line + REPLACE_CONTEXT_LINES)
+        lines = document.lines(first, last)
+        start_offset = sum(len(line) + 1 for line in lines[: start_line - first])
+        end_offset = sum(len(line) + 1 for line in lines[: end_line - first])
+
+        self.cancel_live_search()
+        self.regex_worker.start_expand(
+            "\n".join(lines),
+            pattern,
+            re.IGNORECASE,
+            template,
+            start_offset + start_col,
+            end_offset + end_col,
+        )
+
+        def apply(new):
+            if new is None:
+                # Текст на месте совпадения уже другой: ищем заново
+                self.start_live_search(term, use_regex, select_all)
+                return
+            self._replace_match(start, end, new)
+
+        self._start_replace_poll(apply)
+
+    def _replace_match(self, start, end, new):
+        widget = self.text_frame
+        widget.replace(start, end, new)
+        widget.mark_set("insert", f"{start}+{widget.tk_length(new)}c")
+        widget.highlight_dirty_lines()
+        self._update_toc()
+
+        # Остальные совпадения сдвигаются вслед за правкой, без нового поиска
+        del self.search_matches[self.search_index]
+        self.search_index -= 1
+        start_line, start_col = _split_index(start)
+        end_line, end_col = _split_index(end)
+        new_lines = new.split("\n")
+        line_delta = start_line + len(new_lines) - 1 - end_line
+        last_col = widget.tk_length(new_lines[-1])
+        if len(new_lines) == 1:
+            last_col += start_col
+
+        def shift(index):
+            line, col = _split_index(index)
+            if (line, col) < (end_line, end_col):
+                return index
+            if line == end_line:
+                col += last_col - end_col
+            return f"{line + line_delta}.{col}"
+
+        for match in self.search_matches:
+            match[0], match[1] = shift(match[0]), shift(match[1])
+
+        self.status_label.config(text=f"{len(self.search_matches)} совп.")
+        if self.search_matches:
+            self.goto_next_match()
+        else:
+            widget.tag_remove("search_highlight", "1.0", tk.END)
+
+    def replace_all(self, term, replacement, use_regex):
+        """Заменяет все совпадения одной правкой виджета
+
+        Новый текст считает процесс поиска с тем же бюджетом времени, что и
+        поиск. В виджет уходит единственная замена участка от строки первого
+        совпадения до строки последнего: один шаг отмены, одно событие
+        правки и повторная подсветка только этих строк.
+        """
+        pattern, template = self._replacement_pattern(term, replacement, use_regex)
+        if pattern is None:
+            return
+
+        self.cancel_live_search()
+        widget = self.text_frame
+        self.regex_worker.start_replace(
+            (id(widget), widget.revision),
+            widget.document.text,
+            pattern,
+            re.IGNORECASE,
+            template,
+        )
+        self._start_replace_poll(self._apply_replace_all)
+
+    def _apply_replace_all(self, result):
+        count, first, last, chunk = result
+        widget = self.text_frame
+        widget.tag_remove("search_highlight", "1.0", tk.END)
+        widget.tag_remove("search_highlight_all", "1.0", tk.END)
+        self.search_matches.clear()
+        self.search_index = -1
+        self.search_started = False
+        self.status_label.config(text=f"Заменено: {count}")
+        if chunk is None:
+            return
+
+        start = widget.tk_index(*widget.document.position(first))
+        end = widget.tk_index(*widget.document.position(last))
+        widget.replace(start, end, chunk)
+        widget.mark_set("insert", start)
+        widget.see("insert")
+        widget.highlight_dirty_lines()
+        self._update_toc()
+
+    def _update_toc(self):
+        if self.toc is not None:
+            self.toc.schedule_update()
+
+    def _start_replace_poll(self, apply):
+        """Ждёт итога замены от процесса и применяет его apply(данные)"""
+        self._live_generation += 1
+        self.status_label.config(text="Замена…")
+        self.text_frame.after(
+            LIVE_POLL_MS,
+            self._poll_replace,
+            self._live_generation,
+            self.text_frame.revision,
+            apply,
+        )
+
+    def _poll_replace(self, generation, revision, apply):
+        if generation != self._live_generation:
+            return
+        for kind, payload in self.regex_worker.poll():
+            if kind in ("replaced", "expanded"):
+                if self.text_frame.revision != revision:
+                    self.status_label.config(text="Текст изменился, замена отменена")
+                    return
+                apply(payload)
+                return
+            if kind == "error":
+                self.status_label.config(text="Ошибка замены")
+                DialogManager.show_dialog("Ошибка замены", payload)
+                return
+            if kind == "timeout":
+                budget = self.regex_worker.time_budget
+                self.status_label.config(text=f"Замена прервана ({budget} с)")
+                DialogManager.show_dialog(
+                    "Замена прервана",
+                    f"Выражение не уложилось в {budget} с,\nтекст не изменён",
+                    timeout=3000,
+                )
+                return
+        self.text_frame.after(
+            LIVE_POLL_MS, self._poll_replace, generation, revision, apply
+        )
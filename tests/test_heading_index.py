@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+from heading_index import HeadingIndex, parse_heading
+
+
+def test_parse_heading():
+    assert parse_heading("# Глава") == (1, "Глава")
+    assert parse_heading("## Часть") == (2, "Часть")
+    assert parse_heading("##### Мелкий") == (5, "Мелкий")
+    assert parse_heading("#тег") is None
+    assert parse_heading("Текст") is None
+
+
+def headings(lines):
+    return [
+        (number, parse_heading(line))
+        for number, line in enumerate(lines, 1)
+        if parse_heading(line)
+    ]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_incremental_updates_match_rebuild(seed):
+    rnd = random.Random(seed)
+    pool = ["", "текст", "# Глава", "## Часть", "### Раздел", "#тег"]
+    lines = [rnd.choice(pool) for _ in range(40)]
+    index = HeadingIndex()
+    index.rebuild(lines)
+    # Список строк оглавления, который ведётся только по изменениям индекса
+    rows = [heading for _, heading in headings(lines)]
+
+    def get_lines(first, last):
+        return lines[first - 1 : last]
+
+    for _ in range(100):
+        # Строки first..first+removed заменяются added + 1 новыми
+        first = rnd.randint(1, len(lines))
+        removed = rnd.randint(0, min(4, len(lines) - first))
+        added = rnd.randint(0, 4)
+        lines[first - 1 : first + removed] = [
+            rnd.choice(pool) for _ in range(added + 1)
+        ]
+        lo, hi = index.on_edit(first, removed, added)
+        del rows[lo:hi]
+        if rnd.random() < 0.5:
+            continue
+
+        for op, row, heading in index.refresh(get_lines):
+            if op == "insert":
+                rows.insert(row, heading)
+            elif op == "delete":
+                del rows[row]
+            else:
+                rows[row] = heading
+        expected = headings(lines)
+        assert list(zip(index.lines, map(index.entries.get, index.lines))) == expected
+        assert rows == [heading for _, heading in expected]
+        assert not index.dirty
+
+
+def test_is_dirty_everywhere():
+    index = HeadingIndex()
+    index.rebuild(["# a", "b", "c"])
+    assert not index.is_dirty_everywhere(3)
+    index.on_edit(1, 2, 2)
+    assert index.is_dirty_everywhere(3)
@@ -0,0 +1,75 @@
+import random
+
+import pytest
+
+from line_ranges import LineRanges
+
+
+def covered(ranges):
+    return {line for first, last in ranges for line in range(first, last + 1)}
+
+
+def shifted(lines, line, delta):
+    """Ожидаемый набор после shift(line, delta)"""
+    result = {n for n in lines if n <= line}
+    if delta > 0:
+        result |= {n + delta for n in lines if n > line}
+        if line in lines and line + 1 in lines:
+            # Вставка внутрь диапазона его расширяет
+            result |= set(range(line + 1, line + delta + 1))
+    else:
+        result |= {n + delta for n in lines if n > line - delta}
+    return result
+
+
+def test_add_merges_overlapping_and_adjacent():
+    ranges = LineRanges()
+    ranges.add(5, 7)
+    ranges.add(1, 2)
+    ranges.add(3, 4)
+    ranges.add(10, 12)
+    assert list(ranges) == [(1, 7), (10, 12)]
+    ranges.add(6, 11)
+    assert list(ranges) == [(1, 12)]
+    ranges.add(3, 2)
+    assert list(ranges) == [(1, 12)]
+
+
+def test_missing():
+    ranges = LineRanges()
+    ranges.add(3, 4)
+    ranges.add(8, 9)
+    assert ranges.missing(1, 10) == [(1, 2), (5, 7), (10, 10)]
+    assert ranges.missing(3, 4) == []
+    assert ranges.missing(4, 8) == [(5, 7)]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_random_operations_match_set_model(seed):
+    rnd = random.Random(seed)
+    ranges = LineRanges()
+    model = set()
+    for _ in range(300):
+        choice = rnd.random()
+        if choice < 0.5:
+            first = rnd.randint(1, 60)
+            last = first + rnd.randint(-1, 8)
+            ranges.add(first, last)
+            model |= set(range(first, last + 1))
+        elif choice < 0.95:
+            line = rnd.randint(0, 60)
+            delta = rnd.randint(-5, 5)
+            ranges.shift(line, delta)
+            model = shifted(model, line, delta)
+        else:
+            ranges.clear()
+            model = set()
+
+        assert covered(ranges) == model
+        pairs = list(ranges)
+        for (_, last), (first, _) in zip(pairs, pairs[1:]):
+            assert last + 1 < first
+        first = rnd.randint(1, 70)
+        last = first + rnd.randint(0, 20)
+        missing = covered(ranges.missing(first, last))
+        assert missing == set(range(first, last + 1)) - model
@@ -0,0 +1,184 @@
+import random
+import re
+
+import pytest
+
+from line_ranges import LineRanges
+from markdown_text import MarkdownText
+from text_document import TextDocument
+from undo_journal import UndoJournal
+
+INDEX_RE = re.compile(r"^(end|\d+\.(?:\d+|end))((?:[+-]\d+c)*)$")
+
+
+class FakeTextCommand:
+    """Команды Tk text над строкой, включая правила индексов и DeleteIndexRange
+
+    Текст всегда заканчивается переводом строки, за которым идёт пустая
+    служебная строка Tk: её начало — индекс end.
+    """
+
+    def __init__(self, widget, text):
+        self.widget = widget
+        self.buf = text + "\n"
+
+    def call(self, *args):
+        if len(args) == 1 and isinstance(args[0], tuple):
+            args = args[0]
+        args = [arg for arg in args if arg is not None]
+        command, op, *rest = args
+        if command == "proxy":
+            return self.widget._dispatch(op, *rest)
+        if op == "index":
+            return self.index(self.offset(rest[0]))
+        if op == "get":
+            return self.buf[self.offset(rest[0]) : self.offset(rest[1])]
+        if op == "insert":
+            self.insert(self.offset(rest[0]), "".join(rest[1::2]))
+        elif op == "delete":
+            self.delete(*rest)
+        elif op == "replace":
+            line = int(self.index(self.offset(rest[0])).split(".")[0])
+            col = int(self.index(self.offset(rest[0])).split(".")[1])
+            if self.offset(rest[0]) > self.offset(rest[1]):
+                raise ValueError("index1 after index2")
+            self.delete(rest[0], rest[1])
+            # TextReplaceCmd: вставка по номеру строки и столбцу начала
+            self.insert(self.offset(f"{line}.{col}"), "".join(rest[2::2]))
+        return ""
+
+    def offset(self, index):
+        match = INDEX_RE.match(index)
+        base, mods = match.groups()
+        lines = self.buf.split("\n")
+        if base == "end":
+            offset = len(self.buf)
+        else:
+            line, col = base.split(".")
+            line = int(line)
+            if line > len(lines):
+                offset = len(self.buf)
+            else:
+                start = sum(len(text) + 1 for text in lines[: line - 1])
+                length = len(lines[line - 1])
+                offset = start + (length if col == "end" else min(int(col), length))
+        for sign, count in re.findall(r"([+-])(\d+)c", mods):
+            offset += int(count) if sign == "+" else -int(count)
+        return min(max(offset, 0), len(self.buf))
+
+    def index(self, offset):
+        before = self.buf[:offset]
+        return f"{before.count(chr(10)) + 1}.{offset - before.rfind(chr(10)) - 1}"
+
+    def insert(self, offset, text):
+        # Вставка в служебную строку идёт перед последним переводом строки
+        offset = min(offset, len(self.buf) - 1)
+        self.buf = self.buf[:offset] + text + self.buf[offset:]
+
+    def delete(self, first, last=None):
+        start = self.offset(first)
+        stop = self.offset(last) if last is not None else min(start + 1, len(self.buf))
+        if start >= stop:
+            return
+        if stop == len(self.buf):
+            stop -= 1
+            if start > 0 and self.buf[start - 1] == "\n":
+                start -= 1
+        self.buf = self.buf[:start] + self.buf[stop:]
+
+
+def make_widget(text=""):
+    """MarkdownText без окна: команды Tk исполняет FakeTextCommand"""
+    widget = MarkdownText.__new__(MarkdownText)
+    widget.tk = FakeTextCommand(widget, text)
+    widget._w = "proxy"
+    widget._orig_cmd = "orig"
+    widget.wide_chars = False
+    widget.journal = UndoJournal()
+    widget._journal_suspended = False
+    widget.document = TextDocument(text)
+    widget.highlighted_lines = LineRanges()
+    widget.dirty_lines = LineRanges()
+    widget._edit_listeners = []
+    widget.revision = 0
+    return widget
+
+
+def widget_text(widget):
+    return widget.tk.buf[:-1]
+
+
+def test_delete_through_end_takes_preceding_newline():
+    # Тройной щелчок по последней строке: sel.last == end
+    widget = make_widget("a\nb")
+    widget.delete("2.0", "end")
+    assert widget_text(widget) == "a"
+    assert widget.document.text() == "a"
+    widget.edit_undo()
+    assert widget_text(widget) == "a\nb"
+    assert widget.document.text() == "a\nb"
+
+
+def test_replace_through_end():
+    widget = make_widget("a\nb\nc")
+    widget.replace("2.0", "end", "X")
+    assert widget.document.text() == widget_text(widget)
+    widget.edit_undo()
+    assert widget.document.text() == widget_text(widget) == "a\nb\nc"
+
+
+def test_delete_single_char_at_end_of_empty_last_line():
+    widget = make_widget("a\n")
+    widget.delete("end-1c")
+    assert widget.document.text() == widget_text(widget)
+
+
+def random_index(rnd, widget):
+    lines = widget_text(widget).split("\n")
+    line = rnd.randint(1, len(lines) + 1)
+    choice = rnd.random()
+    if choice < 0.15:
+        return "end"
+    if choice < 0.25:
+        return "end-1c"
+    if choice < 0.4:
+        return f"{line}.end"
+    if choice < 0.6:
+        return f"{line}.0"
+    return f"{line}.{rnd.randint(0, 4)}+{rnd.randint(0, 3)}c"
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_edits_keep_mirror_and_undo(seed):
+    rnd = random.Random(seed)
+    original = "\n".join(rnd.choice(["", "ab", "# h", "xyz"]) for _ in range(5))
+    widget = make_widget(original)
+    states = [original]
+    for _ in range(30):
+        op = rnd.choice(["insert", "delete", "delete1", "replace"])
+        first = random_index(rnd, widget)
+        second = random_index(rnd, widget)
+        text = rnd.choice(["", "q", "\n", "r\ns", "\n\n"])
+        if op == "insert":
+            widget.insert(first, text)
+        elif op == "delete1":
+            widget.delete(first)
+        else:
+            offsets = sorted((widget.tk.offset(first), widget.tk.offset(second)))
+            first, second = (widget.tk.index(offset) for offset in offsets)
+            if op == "delete":
+                widget.delete(first, second)
+            else:
+                widget.replace(first, second, text)
+        assert widget.document.text() == widget_text(widget)
+        widget.journal.separator()
+        if widget_text(widget) != states[-1]:
+            states.append(widget_text(widget))
+
+    while widget.journal.can_undo():
+        widget.edit_undo()
+        assert widget.document.text() == widget_text(widget)
+    assert widget_text(widget) == original
+    while widget.journal.can_redo():
+        widget.edit_redo()
+    assert widget_text(widget) == states[-1]
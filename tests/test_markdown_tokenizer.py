@@ -0,0 +1,49 @@
+from markdown_tokenizer import LineTokenCache, tokenize, tokenize_line
+
+
+def spans(line):
+    return sorted(tokenize_line(line))
+
+
+def test_headings_info_and_lists():
+    assert spans("# Глава") == [("h1", 0, 7)]
+    assert spans("### Раздел") == [("h3", 0, 10)]
+    assert spans("% author") == [("info", 0, 8)]
+    assert spans("- пункт") == [("list", 0, 7)]
+    assert spans("#глава") == [("tag", 0, 6)]
+    assert spans("####### много") == []
+
+
+def test_emphasis_does_not_overlap():
+    assert spans("***всё***") == [("bold_italic", 0, 9)]
+    assert spans("a **b** c") == [("bold", 2, 7)]
+    assert spans("*a* **b**") == [("bold", 4, 9), ("italic", 0, 3)]
+    assert spans("***a*** *b*") == [("bold_italic", 0, 7), ("italic", 8, 11)]
+
+
+def test_tag_code_and_link():
+    assert spans("см. #тег и") == [("tag", 4, 9)]
+    # Тег в конце строки заканчивается вместе с ней
+    assert spans("см. #тег") == [("tag", 4, 8)]
+    assert spans("вызов `f()` тут") == [("code", 6, 11)]
+    assert spans("[сайт](http://x)") == [("link", 0, 16)]
+
+
+def test_tokenize_offsets():
+    text = "# A\n\n**b**"
+    assert tokenize(text) == [("h1", 0, 3), ("bold", 5, 10)]
+
+
+def test_line_token_cache():
+    cache = LineTokenCache(maxsize=2)
+    for line in ("# a", "**b**", "# a", "`c`"):
+        assert list(cache.tokenize_line(line)) == tokenize_line(line)
+    hits, misses, size, maxsize = cache.info()
+    assert (hits, misses, size, maxsize) == (1, 3, 2, 2)
+    # "**b**" вытеснена как давно не использованная
+    cache.tokenize_line("**b**")
+    assert cache.info()[1] == 4
+    cache.resize(1)
+    assert cache.info()[2] == 1
+    cache.clear()
+    assert cache.info() == (0, 0, 0, 1)
@@ -0,0 +1,68 @@
+import random
+
+from paragraph_alignment import (
+    SECTION_WINDOW,
+    ParagraphAlignment,
+    align_section,
+    align_windows,
+)
+
+
+def make_pair(seed, paragraphs):
+    """Оригинал и «перевод» того же размера с выпавшими и лишними абзацами"""
+    rnd = random.Random(seed)
+    left = []
+    right = []
+    for _ in range(paragraphs):
+        text = "x" * rnd.randint(5, 600)
+        left += [text, ""]
+        chance = rnd.random()
+        if chance < 0.02:
+            continue
+        if chance < 0.04:
+            right += ["z" * rnd.randint(5, 600), ""]
+        right += ["y" * max(1, int(len(text) * rnd.uniform(0.8, 1.2))), ""]
+    return left, right
+
+
+def test_align_section_steps_cover_both_sides():
+    rnd = random.Random(1)
+    for _ in range(200):
+        left = [rnd.randint(0, 300) for _ in range(rnd.randint(0, 40))]
+        right = [rnd.randint(0, 300) for _ in range(rnd.randint(0, 40))]
+        moves = align_section(left, right)
+        assert sum(di for di, _ in moves) == len(left)
+        assert sum(dj for _, dj in moves) == len(right)
+
+
+def test_windows_match_whole_section():
+    rnd = random.Random(2)
+    left = [rnd.randint(5, 600) for _ in range(3 * SECTION_WINDOW)]
+    right = [int(size * rnd.uniform(0.8, 1.2)) for size in left]
+    del right[500:503]
+    assert align_windows(left, right, {}, {}) == align_section(left, right)
+
+
+def test_rebuild_after_edit_reuses_windows():
+    left, right = make_pair(3, 3000)
+    alignment = ParagraphAlignment()
+    alignment.apply(alignment.build(left, right))
+    cached = set(alignment._sections)
+    assert len(cached) > 3
+
+    edited = left[:100] + left[104:]
+    alignment.apply(alignment.build(edited, right))
+    assert len(cached & set(alignment._sections)) >= len(cached) - 3
+    fresh = ParagraphAlignment()
+    fresh.apply(fresh.build(edited, right))
+    for line in range(1, len(edited) + 1, 7):
+        assert alignment.left_to_right(line) == fresh.left_to_right(line)
+
+
+def test_headings_are_anchors():
+    left = ["# One", "", "a" * 50, "", "# Two", "", "b" * 80]
+    right = ["# Один", "", "а" * 55, "", "в" * 20, "", "# Два", "", "б" * 90]
+    alignment = ParagraphAlignment()
+    alignment.apply(alignment.build(left, right))
+    assert alignment.left_to_right(5) == 7
+    assert alignment.right_to_left(7) == 5
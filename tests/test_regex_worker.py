@@ -0,0 +1,48 @@
+import random
+import re
+
+from regex_worker import _replace_all, _run
+
+
+class FakeConnection:
+    def __init__(self):
+        self.spans = []
+
+    def send(self, message):
+        _, kind, payload = message
+        if kind == "batch":
+            self.spans.extend(payload)
+
+
+def run_spans(text, pattern, cursor):
+    conn = FakeConnection()
+    _run(conn, 1, text, re.compile(pattern), cursor)
+    return conn.spans
+
+
+def test_wrap_around_does_not_overlap_first_pass():
+    assert run_spans("aaaa", "aa", 1) == [(1, 3)]
+
+
+def test_wrap_around_order_starts_at_cursor():
+    assert run_spans("ab ab ab", "ab", 4) == [(6, 8), (0, 2), (3, 5)]
+
+
+def test_random_spans_do_not_overlap():
+    rnd = random.Random(0)
+    patterns = ["a", "aa", "a*", "b?a", "^a", "a$", "(?m)^", "ab|ba"]
+    for _ in range(5000):
+        text = "".join(rnd.choice("ab\n") for _ in range(rnd.randint(0, 12)))
+        spans = run_spans(text, rnd.choice(patterns), rnd.randint(0, len(text)))
+        assert len(set(spans)) == len(spans)
+        ordered = sorted(spans)
+        for (_, end), (start, _) in zip(ordered, ordered[1:]):
+            assert end <= start
+
+
+def test_replace_all_returns_changed_lines():
+    text = "one\ntwo two\nthree\nfour two"
+    count, first, last, chunk = _replace_all(text, re.compile("two"), "2")
+    assert count == 3
+    assert text[:first] + chunk + text[last:] == text.replace("two", "2")
+    assert text[first:last] == "two two\nthree\nfour two"
@@ -0,0 +1,108 @@
+import glob
+import os
+import random
+import re
+import timeit
+
+import pytest
+
+from text_corrector import TextCorrector, replacements
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "sample")
+SAMPLE_BOOKS = sorted(glob.glob(os.path.join(SAMPLE_DIR, "*.md")))
+
+# Прежний конвейер замен: эталон, с которым результат совпадает побайтно
+LEGACY_REGEX = {
+    "\\.{2,}": "…",
+    "…{2,}": "…",
+    " {2,}": " ",
+    "…(?!\\s)": "… ",
+    "^\\. ": "",
+    "(?<!\n)\n(?!\n|#|\\*)": "\n\n",
+}
+
+
+def legacy_fix_line_start_spaces(content):
+    new_lines = []
+    for line in content.splitlines():
+        stripped = line.lstrip()
+        if line.startswith(("#", "%")) or stripped.startswith("*"):
+            new_lines.append(line)
+        else:
+            new_lines.append(" " + stripped if stripped else stripped)
+    return "\n".join(new_lines)
+
+
+def legacy_replacements(content):
+    for old, new in replacements["simple"].items():
+        content = content.replace(old, new)
+    for pattern, repl in LEGACY_REGEX.items():
+        content = re.sub(pattern, repl, content, flags=re.MULTILINE)
+    content = re.sub(r" \n", "\n", content)
+    content = re.sub(r"\n #", "\n#", content)
+    content = re.sub(r"\n %", "\n%", content)
+    content = re.sub(r"\n\n%", "\n%", content)
+    content = legacy_fix_line_start_spaces(content)
+    return content.strip() + "\n"
+
+
+def raw_book(lines=20000, seed=2):
+    """Текст «как из конвертера»: переносы внутри абзацев, отступы, кавычки"""
+    rnd = random.Random(seed)
+    words = [
+        "слово", "текст", "«Да»", "- сказал", "он..", "так...", "нет ,",
+        "вот !", "что ?", "a  b", "“x”", "–", "*курсив* ", "итак…", ". .",
+    ]  # fmt: skip
+    result = []
+    for _ in range(lines):
+        indent = "   " * rnd.randint(0, 2)
+        result.append(indent + " ".join(rnd.choices(words, k=rnd.randint(3, 10))))
+        if rnd.random() < 0.3:
+            result.append("")
+        if rnd.random() < 0.02:
+            result.append("## Глава")
+    return "\n".join(result)
+
+
+@pytest.fixture(scope="module")
+def corrector():
+    return TextCorrector(None)
+
+
+@pytest.mark.parametrize("path", SAMPLE_BOOKS, ids=os.path.basename)
+def test_sample_books_identical(corrector, path):
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read().strip()
+    result = corrector.apply_replacements(text)
+    assert result.encode("utf-8") == legacy_replacements(text).encode("utf-8")
+
+
+def test_raw_book_identical(corrector):
+    text = raw_book()
+    assert corrector.apply_replacements(text) == legacy_replacements(text)
+
+
+def test_random_fragments_identical(corrector):
+    # Правила зависят от порядка и соседства символов: перебираем короткие
+    # строки из «опасного» алфавита, включая переводы строк splitlines()
+    alphabet = [
+        ".", "…", " ", "  ", "\n", "\n\n", "#", "%", "*", "_", "a", "Б",
+        "\t", "\xa0", "-", "–", "«", "»", '"', ",", "!", "?", "\r", "\x0c",
+    ]  # fmt: skip
+    rnd = random.Random(1)
+    for _ in range(20000):
+        text = "".join(rnd.choices(alphabet, k=rnd.randint(0, 30)))
+        assert corrector.apply_replacements(text) == legacy_replacements(text), text
+
+
+def test_benchmark(corrector, capsys):
+    text = raw_book()
+    legacy = min(timeit.repeat(lambda: legacy_replacements(text), number=1, repeat=3))
+    current = min(
+        timeit.repeat(lambda: corrector.apply_replacements(text), number=1, repeat=3)
+    )
+    with capsys.disabled():
+        print(
+            f"\napply_replacements, {len(text)} символов: "
+            f"{legacy * 1000:.1f} мс -> {current * 1000:.1f} мс"
+        )
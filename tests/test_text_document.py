@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+import text_document
+from text_document import TextDocument
+
+
+@pytest.fixture(params=[512, 3])
+def block_lines(request, monkeypatch):
+    # Маленькие блоки проверяют деление и слияние блоков на коротких текстах
+    monkeypatch.setattr(text_document, "BLOCK_LINES", request.param)
+    return request.param
+
+
+def check(document, text, rnd):
+    lines = text.split("\n")
+    assert document.text() == text
+    assert document.line_count() == len(lines)
+    assert document.lines() == lines
+    for number in range(1, len(lines) + 1):
+        assert document.line(number) == lines[number - 1]
+    first = rnd.randint(1, len(lines))
+    last = rnd.randint(first, len(lines))
+    assert document.lines(first, last) == lines[first - 1 : last]
+
+
+def test_offset_and_position_round_trip(block_lines):
+    text = "\n".join("x" * (n % 7) for n in range(40))
+    document = TextDocument(text)
+    for offset in range(len(text) + 1):
+        line, col = document.position(offset)
+        assert document.offset(line, col) == offset
+        before = text[:offset]
+        assert line == before.count("\n") + 1
+        assert col == offset - before.rfind("\n") - 1
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_replace_matches_plain_string(block_lines, seed):
+    rnd = random.Random(seed)
+    text = "\n".join(rnd.choice(["", "ab", "cde", "# h"]) for _ in range(30))
+    document = TextDocument(text)
+    pieces = ["", "q", "\n", "r\ns", "\n\n\n", "\n".join("z" * 10)]
+    for _ in range(300):
+        start = rnd.randint(0, len(text))
+        end = rnd.randint(start, min(len(text), start + rnd.choice([0, 3, 40])))
+        inserted = rnd.choice(pieces)
+        line, col = document.position(start)
+        document.replace(line, col, text[start:end], inserted)
+        text = text[:start] + inserted + text[end:]
+        check(document, text, rnd)
+        assert all(document._blocks)
+        assert max(map(len, document._blocks)) <= 2 * block_lines
+
+
+def test_lines_outside_document():
+    document = TextDocument("a\nb")
+    assert document.lines(3) == []
+    assert document.lines(2, 10) == ["b"]
+    assert document.line(10) == "b"
@@ -0,0 +1,91 @@
+from undo_journal import RECORD_OVERHEAD, UndoJournal
+
+
+def steps(journal):
+    return [list(step) for step in journal._undo]
+
+
+def test_typing_merges_into_one_record():
+    journal = UndoJournal()
+    for col, char in enumerate("abc"):
+        journal.record(f"1.{col}", "", char)
+    assert steps(journal) == [[("1.0", "", "abc")]]
+
+
+def test_backspace_and_delete_merge():
+    journal = UndoJournal()
+    journal.record("1.2", "c", "")
+    journal.record("1.1", "b", "")
+    assert steps(journal) == [[("1.1", "bc", "")]]
+
+    journal.separator()
+    journal.record("2.0", "x", "")
+    journal.record("2.0", "y", "")
+    assert steps(journal)[-1] == [("2.0", "xy", "")]
+
+
+def test_newline_and_other_line_do_not_merge():
+    journal = UndoJournal()
+    journal.record("1.0", "", "a")
+    journal.record("1.1", "", "\n")
+    journal.record("2.0", "", "b")
+    assert steps(journal) == [[("1.0", "", "a"), ("1.1", "", "\n"), ("2.0", "", "b")]]
+
+
+def test_kind_change_separator_and_replace_start_new_steps():
+    journal = UndoJournal()
+    journal.record("1.0", "", "a")
+    journal.record("1.0", "a", "")
+    journal.separator()
+    journal.record("1.0", "", "b")
+    journal.record("1.0", "b", "c")
+    journal.record("1.0", "c", "d")
+    assert len(steps(journal)) == 5
+
+
+def test_group_makes_one_step():
+    journal = UndoJournal()
+    with journal.group():
+        journal.record("1.0", "", "a")
+        journal.record("1.0", "a", "b")
+        with journal.group():
+            journal.record("2.0", "x", "")
+    journal.record("3.0", "", "z")
+    assert len(steps(journal)) == 2
+    assert len(steps(journal)[0]) == 3
+
+
+def test_undo_redo_move_steps_and_new_record_clears_redo():
+    journal = UndoJournal()
+    journal.record("1.0", "", "a")
+    journal.separator()
+    journal.record("1.1", "", "b")
+    assert journal.pop_undo() == [("1.1", "", "b")]
+    assert journal.can_redo()
+    assert journal.pop_redo() == [("1.1", "", "b")]
+    journal.pop_undo()
+    journal.record("1.1", "", "c")
+    assert not journal.can_redo()
+    assert journal.size == 2 * (RECORD_OVERHEAD + 1)
+
+
+def test_budget_drops_oldest_steps_but_keeps_current():
+    journal = UndoJournal(byte_budget=3 * (RECORD_OVERHEAD + 10))
+    for n in range(10):
+        journal.record(f"{n + 1}.0", "", str(n) * 10)
+        journal.separator()
+    assert journal.size <= journal.byte_budget
+    assert [step[0][2][0] for step in steps(journal)] == ["7", "8", "9"]
+
+    journal.record("20.0", "", "x" * 1000)
+    assert steps(journal) == [[("20.0", "", "x" * 1000)]]
+    assert journal.size == RECORD_OVERHEAD + 1000
+
+
+def test_reset():
+    journal = UndoJournal()
+    journal.record("1.0", "", "a")
+    journal.pop_undo()
+    journal.reset()
+    assert not journal.can_undo() and not journal.can_redo()
+    assert journal.size == 0
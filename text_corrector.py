@@ -1,6 +1,5 @@
 import os
 import re
-import tkinter as tk
 
 from markdown_text import MarkdownText
 
@@ -35,26 +34,63 @@ replacements = {
         ", #": " #",
         ".…": "…",
     },
+    # Выражения начинаются с литерала: re ищет его быстрым поиском подстроки,
+    # а не пробует шаблон в каждой позиции текста
     "regex": {
-        "\\.{2,}": "…",
-        "…{2,}": "…",
-        " {2,}": " ",
+        "\\.\\.+": "…",  # \.{2,}
+        "……+": "…",  # …{2,}
+        "  +": " ",  # " {2,}"
         "…(?!\\s)": "… ",
-        "^\\. ": "",
-        "(?<!\n)\n(?!\n|#|\\*)": "\n\n",
+        "\\.(?<![^\n]\\.) ": "",  # ^\. (в начале строки)
+        "\n(?<!\n\n)(?![\n#*])": "\n\n",  # (?<!\n)\n(?!\n|#|\*)
     },
 }
 
+# Чистка после замен: пробелы перед переводом строки и отступы служебных строк
+cleanup_replacements = {
+    " \n": "\n",
+    "\n #": "\n#",
+    "\n %": "\n%",
+    "\n\n%": "\n%",
+}
+
+# Переводы строк, которые splitlines() знает помимо "\n"
+LINE_BREAKS = re.compile("[\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+# Строка из одних пробелов и отступ перед текстом обычной строки. Каждая
+# строка текста предваряется "\n", поэтому выражения начинаются с литерала
+BLANK_LINE = re.compile(r"\n[^\S\n]+(?=\n|\Z)")
+LINE_INDENT = re.compile(r"\n(?![#%])[^\S\n]*(?=[^\s*])")
+
+
+def compile_replacements(table):
+    """Таблица замен в список шагов (old, new, выражение или None)
+
+    Шаги выполняются строго по порядку таблицы: правило видит результат
+    предыдущих. Литеральные правила остаются проходами str.replace — он
+    ищет подстроку быстрее, чем re перебирает альтернативы, и не копирует
+    текст, если её нет. Выражения компилируются один раз.
+    """
+    steps = [(old, new, None) for old, new in table["simple"].items()]
+    steps += [
+        (pattern, repl, re.compile(pattern, re.MULTILINE))
+        for pattern, repl in table["regex"].items()
+    ]
+    steps += [(old, new, None) for old, new in cleanup_replacements.items()]
+    return steps
+
+
+REPLACEMENT_STEPS = compile_replacements(replacements)
+
 
 class TextCorrector:
     def __init__(self, text_frame: MarkdownText):
         self.text_frame = text_frame
 
     def correct_text(self, file_path):
-        text = self.text_frame.get("1.0", tk.END).strip()
+        text = self.text_frame.document.text().strip()
         text = self.normalize_text(text, file_path)
-        self.text_frame.delete("1.0", tk.END)
-        self.text_frame.insert(tk.END, text)
+        # Дифф вместо полной перезаписи: правку можно отменить одним шагом
+        self.text_frame.set_text(text)
         self.text_frame.highlight_markdown()
 
     def normalize_text(self, content: str, file_path: str) -> str:
@@ -79,22 +115,24 @@ class TextCorrector:
         elif content.startswith("\n%"):
             content = f"% {base_name}{content}"
 
-        # Простые замены
-        for old, new in replacements["simple"].items():
-            content = content.replace(old, new)
-
-        # Замены через регулярки
-        for pattern, repl in replacements["regex"].items():
-            content = re.sub(pattern, repl, content, flags=re.MULTILINE)
+        return self.apply_replacements(content)
 
-        # Убираем пробелы перед \n
-        content = re.sub(r" \n", "\n", content)
-        content = re.sub(r"\n #", "\n#", content)
-        content = re.sub(r"\n %", "\n%", content)
-        content = re.sub(r"\n\n%", "\n%", content)
+    def apply_replacements(self, content: str) -> str:
+        # Простые замены, регулярки и чистка — одним списком шагов
+        for old, new, pattern in REPLACEMENT_STEPS:
+            if pattern:
+                content = pattern.sub(new, content)
+            else:
+                content = content.replace(old, new)
 
         # Гарантируем ровно один пробел в начале строки
-        content = self.fix_line_start_spaces(content)
+        if LINE_BREAKS.search(content):
+            content = self.fix_line_start_spaces(content)
+        else:
+            # То же, что fix_line_start_spaces, двумя проходами по тексту;
+            # лишний "\n" в конце текста снимает strip() ниже
+            content = BLANK_LINE.sub("\n", "\n" + content)
+            content = LINE_INDENT.sub("\n ", content)[1:]
 
         return content.strip() + "\n"
 
@@ -113,3 +151,4 @@ class TextCorrector:
                     line = stripped
                 new_lines.append(line)
         return "\n".join(new_lines)
+
@@ -0,0 +1,128 @@
+from bisect import bisect_right
+
+# Целевой размер блока строк: блоки вдвое больше делятся пополам
+BLOCK_LINES = 512
+
+
+class TextDocument:
+    """Модель текста виджета: блоки строк с индексом смещений
+
+    Хранит то же содержимое, что Text между "1.0" и "end-1c", списком блоков
+    строк без переводов строки. Начала блоков по строкам и символам лежат
+    в префиксных массивах, поэтому поиск строки и перевод смещения в позицию
+    стоят O(log n + BLOCK_LINES), а правка затрагивает только свои блоки.
+    Строки и столбцы нумеруются как в Tk: строки с 1, столбцы с 0.
+    """
+
+    def __init__(self, text=""):
+        self.set_text(text)
+
+    def set_text(self, text):
+        lines = text.split("\n")
+        self._blocks = [
+            lines[i : i + BLOCK_LINES] for i in range(0, len(lines), BLOCK_LINES)
+        ]
+        self._block_chars = [_chars(block) for block in self._blocks]
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        self._line_starts = []
+        self._char_starts = []
+        lines = 0
+        chars = 0
+        for block, block_chars in zip(self._blocks, self._block_chars):
+            self._line_starts.append(lines)
+            self._char_starts.append(chars)
+            lines += len(block)
+            chars += block_chars
+        self._line_total = lines
+        # Последняя строка не заканчивается переводом строки
+        self._char_total = chars - 1
+
+    def _locate(self, line):
+        """Блок и номер строки внутри блока для строки line (с 1)"""
+        line = min(max(line, 1), self._line_total) - 1
+        block = bisect_right(self._line_starts, line) - 1
+        return block, line - self._line_starts[block]
+
+    def line_count(self):
+        return self._line_total
+
+    def line(self, line):
+        block, local = self._locate(line)
+        return self._blocks[block][local]
+
+    def lines(self, first=1, last=None):
+        """Список строк [first, last] без копирования их содержимого"""
+        if last is None or last > self._line_total:
+            last = self._line_total
+        if first > last:
+            return []
+        block, local = self._locate(first)
+        result = []
+        count = last - first + 1
+        while len(result) < count:
+            result.extend(self._blocks[block][local : local + count - len(result)])
+            block += 1
+            local = 0
+        return result
+
+    def text(self):
+        return "\n".join(self.lines())
+
+    def offset(self, line, col=0):
+        """Смещение символа от начала текста"""
+        block, local = self._locate(line)
+        offset = self._char_starts[block]
+        for text in self._blocks[block][:local]:
+            offset += len(text) + 1
+        return offset + col
+
+    def position(self, offset):
+        """Позиция (строка, столбец) для смещения символа"""
+        offset = min(max(offset, 0), self._char_total)
+        block = bisect_right(self._char_starts, offset) - 1
+        line = self._line_starts[block] + 1
+        offset -= self._char_starts[block]
+        for text in self._blocks[block]:
+            if offset <= len(text):
+                break
+            offset -= len(text) + 1
+            line += 1
+        return line, offset
+
+    def replace(self, line, col, removed, inserted):
+        """Заменяет текст removed, начинающийся в (line, col), на inserted"""
+        removed_lines = removed.split("\n")
+        last = line + len(removed_lines) - 1
+        end_col = len(removed_lines[-1])
+        if len(removed_lines) == 1:
+            end_col += col
+
+        head = self.line(line)[:col]
+        tail = self.line(last)[end_col:]
+        self._replace_lines(line, last, (head + inserted + tail).split("\n"))
+
+    def _replace_lines(self, first, last, new_lines):
+        """Заменяет строки [first, last] списком new_lines"""
+        first_block, first_local = self._locate(first)
+        last_block, last_local = self._locate(last)
+
+        lines = self._blocks[first_block][:first_local] + new_lines
+        lines += self._blocks[last_block][last_local + 1 :]
+
+        if len(lines) > BLOCK_LINES * 2:
+            blocks = [
+                lines[i : i + BLOCK_LINES] for i in range(0, len(lines), BLOCK_LINES)
+            ]
+        else:
+            blocks = [lines]
+        self._blocks[first_block : last_block + 1] = blocks
+        self._block_chars[first_block : last_block + 1] = [
+            _chars(block) for block in blocks
+        ]
+        self._rebuild_index()
+
+
+def _chars(block):
+    return sum(len(text) for text in block) + len(block)
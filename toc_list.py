@@ -1,28 +1,133 @@
 import tkinter as tk
+from bisect import bisect_left
+from tkinter import font
 
+from heading_index import HeadingIndex
 from markdown_text import MarkdownText
 
+# Самый глубокий уровень заголовков
+MAX_LEVEL = 5
+
+
+class TOCList(tk.Canvas):
+    """Виртуальный список заголовков: на холсте рисуются только видимые строки
+
+    Прокрутка — штатная прокрутка холста по scrollregion высотой во все
+    строки, поэтому стоимость отрисовки не зависит от числа заголовков.
+    """
 
-class TOCList(tk.Listbox):
     def __init__(
         self, parent, text_widget: MarkdownText | None = None, *args, **kwargs
     ):
+        self._yscrollcommand = None
         super().__init__(parent, *args, **kwargs)
-        self.text_widget = text_widget
+        self.text_widget = None
+
+        self.font = font.nametofont("TkDefaultFont")
+        self.row_height = self.font.metrics("linespace") + 2
+        self.configure(
+            width=25 * self.font.measure("0"),
+            background="white",
+            highlightthickness=0,
+            yscrollincrement=self.row_height,
+            takefocus=1,
+        )
+        super().configure(yscrollcommand=self._on_view_changed)
+
+        # Щелчок переходит к заголовку и возвращает фокус в текст; с клавиатуры
+        # (фокус по Tab) заголовки листаются стрелками, Return — в текст
+        self.bind("<ButtonRelease-1>", self.on_click)
+        self.bind("<Up>", lambda e: self.move_selection(-1))
+        self.bind("<Down>", lambda e: self.move_selection(1))
+        self.bind("<Return>", lambda e: self.focus_text())
+        self.bind("<Configure>", lambda e: self.redraw())
+        self.bind("<Button-4>", lambda e: self.yview_scroll(-3, "units"))
+        self.bind("<Button-5>", lambda e: self.yview_scroll(3, "units"))
+        self.bind(
+            "<MouseWheel>",
+            lambda e: self.yview_scroll(-3 if e.delta > 0 else 3, "units"),
+        )
 
-        self.configure(width=25, activestyle="none", exportselection=False)
-        self.bind("<ButtonRelease-1>", self.on_select)
-        self.bind("<<ListboxSelect>>", self.on_select)
+        # Сворачивание по уровню: клавиши 1-5, +/- в оглавлении, те же клавиши
+        # с Alt в тексте (см. set_text_widget) и контекстное меню
+        self._bind_level_keys(self, "")
+        self.level_menu = tk.Menu(self, tearoff=0)
+        for level in range(1, MAX_LEVEL):
+            self.level_menu.add_command(
+                label=f"Уровни 1–{level}",
+                command=lambda n=level: self.set_max_level(n),
+            )
+        self.level_menu.add_command(
+            label="Все уровни", command=lambda: self.set_max_level(MAX_LEVEL)
+        )
+        self.bind("<Button-3>", self.show_level_menu)
 
-        # Словарь для хранения соответствия "заголовок" -> "номер строки"
-        self.headers_data = {}
+        # Индекс заголовков и видимые (не свёрнутые) позиции в нём
+        self.headings = HeadingIndex()
+        self.max_level = MAX_LEVEL
+        self._visible_rows = None
+        self.selected_row = None
+
+        # Переиспользуемые элементы холста: [id, текст, y]
+        self._items = []
+        self._selection_item = self.create_rectangle(
+            0, 0, 0, 0, fill="#cce4ff", outline="", state="hidden"
+        )
+        self._redraw_job = None
         self._update_job = None
 
-    def check_contains_text(self, text):
-        return any(text in str(value) for value in self.headers_data.values())
+        if text_widget is not None:
+            self.set_text_widget(text_widget)
+
+    def configure(self, cnf=None, **kw):
+        # Полосу прокрутки обновляем сами, после каждой смены вида
+        if "yscrollcommand" in kw:
+            self._yscrollcommand = kw.pop("yscrollcommand")
+        return super().configure(cnf, **kw)
+
+    config = configure
+
+    def _on_view_changed(self, first, last):
+        if self._yscrollcommand:
+            self._yscrollcommand(first, last)
+        self.redraw()
+
+    def is_heading_line(self, line):
+        """Была ли строка заголовком при последнем обновлении (O(1))"""
+        return line in self.headings.entries
 
     def set_text_widget(self, widget):
         self.text_widget = widget
+        self.headings = HeadingIndex()
+        self.selected_row = None
+        if widget is not None:
+            widget.add_edit_listener(self.on_text_edit)
+            self._bind_level_keys(widget, "Alt-")
+        self._headings_changed()
+
+    def _bind_level_keys(self, widget, modifier):
+        def bind(key, level):
+            def handler(event):
+                self.set_max_level(level())
+                return "break"
+
+            widget.bind(f"<{modifier}{key}>", handler)
+
+        for n in range(1, MAX_LEVEL + 1):
+            bind(f"Key-{n}", lambda n=n: n)
+        bind("minus", lambda: self.max_level - 1)
+        bind("plus", lambda: self.max_level + 1)
+        bind("equal", lambda: self.max_level + 1)
+
+    def on_text_edit(self, first, removed, added):
+        """Сдвигает индекс заголовков; исчезнувшие строки сразу убираем из списка"""
+        lo, hi = self.headings.on_edit(first, removed, added)
+        if lo < hi:
+            if self.selected_row is not None and self.selected_row >= lo:
+                self.selected_row = (
+                    self.selected_row - (hi - lo) if self.selected_row >= hi else None
+                )
+            self._headings_changed()
 
     def schedule_update(self):
         if self._update_job:
@@ -30,75 +135,201 @@ class TOCList(tk.Listbox):
         self._update_job = self.after(300, self.update_toc)
 
     def update_toc(self):
-        # сохраняем индекс выделенного элемента
-        selected_index = None
-        selection = self.curselection()
-        if selection:
-            selected_index = selection[0]
+        """Обновляет список: перечитывает только изменённые строки"""
+        self._update_job = None
+        if not self.winfo_manager():
+            # Скрытое оглавление догонит правки при следующем показе
+            return
+        if not self.text_widget:
+            self.headings = HeadingIndex()
+            self.selected_row = None
+            self._headings_changed()
+            return
+
+        document = self.text_widget.document
+        if not self.headings.built or self.headings.is_dirty_everywhere(
+            document.line_count()
+        ):
+            self.rebuild_toc()
+            return
 
-        scroll_pos = self.yview()[0]
+        changes = self.headings.refresh(document.lines)
+        for op, row, _ in changes:
+            if self.selected_row is None or row > self.selected_row:
+                continue
+            if op == "insert":
+                self.selected_row += 1
+            elif op == "delete":
+                self.selected_row = (
+                    None if row == self.selected_row else self.selected_row - 1
+                )
+        if changes:
+            self._headings_changed()
 
-        self.delete(0, tk.END)
-        self.headers_data.clear()
+    def rebuild_toc(self):
+        self.headings.rebuild(self.text_widget.document.lines())
+        if self.selected_row is not None and self.selected_row >= len(self.headings):
+            self.selected_row = None
+        self._headings_changed()
 
-        if not self.text_widget:
+    def set_max_level(self, level):
+        """Показывает только заголовки с уровнем не глубже level"""
+        level = min(max(level, 1), MAX_LEVEL)
+        if level == self.max_level:
+            return
+        self.max_level = level
+        self._headings_changed()
+
+    def show_level_menu(self, event):
+        self.level_menu.tk_popup(event.x_root, event.y_root)
+
+    def _headings_changed(self):
+        if self.max_level < MAX_LEVEL:
+            entries = self.headings.entries
+            self._visible_rows = [
+                row
+                for row, line in enumerate(self.headings.lines)
+                if entries[line][0] <= self.max_level
+            ]
+        else:
+            self._visible_rows = None
+        height = self.row_count() * self.row_height
+        super().configure(scrollregion=(0, 0, 0, height))
+        self.redraw()
+
+    def row_count(self):
+        if self._visible_rows is None:
+            return len(self.headings)
+        return len(self._visible_rows)
+
+    def _heading_row(self, index):
+        """Позиция в индексе заголовков для видимой строки index"""
+        if self._visible_rows is None:
+            return index
+        return self._visible_rows[index]
+
+    def _visible_index(self, row):
+        """Видимая строка для позиции в индексе или None, если она свёрнута"""
+        if self._visible_rows is None:
+            return row
+        # Видимые позиции отсортированы
+        index = bisect_left(self._visible_rows, row)
+        if index < len(self._visible_rows) and self._visible_rows[index] == row:
+            return index
+        return None
+
+    def redraw(self):
+        """Планирует перерисовку: несколько вызовов за кадр сливаются в один"""
+        if self._redraw_job is None:
+            self._redraw_job = self.after_idle(self._redraw)
+
+    def _redraw(self):
+        self._redraw_job = None
+        top = self.canvasy(0)
+        first = max(0, int(top // self.row_height))
+        last = min(
+            self.row_count(), int((top + self.winfo_height()) // self.row_height) + 1
+        )
+
+        lines = self.headings.lines
+        entries = self.headings.entries
+        count = 0
+        for index in range(first, last):
+            heading = entries[lines[self._heading_row(index)]]
+            self._place(count, self.format_heading(heading), index * self.row_height)
+            count += 1
+
+        # Лишние элементы прячем, а не удаляем
+        for item in self._items[count:]:
+            if item[1] is not None:
+                self.itemconfigure(item[0], state="hidden")
+                item[1] = None
+
+        selected = None
+        if self.selected_row is not None:
+            selected = self._visible_index(self.selected_row)
+        if selected is not None and first <= selected < last:
+            y = selected * self.row_height
+            width = self.winfo_width()
+            self.coords(self._selection_item, 0, y, width, y + self.row_height)
+            self.itemconfigure(self._selection_item, state="normal")
+        else:
+            self.itemconfigure(self._selection_item, state="hidden")
+
+    def _place(self, n, text, y):
+        if n == len(self._items):
+            item_id = self.create_text(
+                4, y + 1, anchor="nw", text=text, font=self.font
+            )
+            self._items.append([item_id, text, y])
+            return
+
+        item = self._items[n]
+        if item[1] is None:
+            self.itemconfigure(item[0], state="normal")
+        if item[1] != text:
+            self.itemconfigure(item[0], text=text)
+            item[1] = text
+        if item[2] != y:
+            self.coords(item[0], 4, y + 1)
+            item[2] = y
+
+    @staticmethod
+    def format_heading(heading):
+        level, title = heading
+        return "  " * (level - 1) + title
+
+    def on_click(self, event):
+        index = int(self.canvasy(event.y) // self.row_height)
+        if 0 <= index < self.row_count():
+            self.selected_row = self._heading_row(index)
+            self.redraw()
+            self.on_select()
+        self.focus_text()
+
+    def move_selection(self, step):
+        """Выбирает соседний видимый заголовок и переходит к нему в тексте"""
+        count = self.row_count()
+        if not count:
             return
+        if self.selected_row is None:
+            index = 0 if step > 0 else count - 1
+        else:
+            index = self._visible_index(self.selected_row)
+            if index is None:
+                # Выбранный заголовок свёрнут: берём ближайший видимый
+                index = bisect_left(self._visible_rows, self.selected_row)
+                if step > 0:
+                    step -= 1
+            index = min(max(index + step, 0), count - 1)
+        self.selected_row = self._heading_row(index)
+        self._see_row(index)
+        self.redraw()
+        self.on_select()
 
-        lines = self.text_widget.get("1.0", tk.END).split("\n")
-
-        # Заполняем список и карту номерами строк
-        for i, line in enumerate(lines, 1):
-            if line.startswith("# "):
-                title = line[2:]
-                self.insert(tk.END, f"{title}")
-                listbox_index = self.size() - 1
-                self.headers_data[listbox_index] = (i, title)
-            elif line.startswith("#####"):
-                title = line[6:]
-                self.insert(tk.END, f"        {title}")
-                listbox_index = self.size() - 1
-                self.headers_data[listbox_index] = (i, title)
-            elif line.startswith("####"):
-                title = line[5:]
-                self.insert(tk.END, f"      {title}")
-                listbox_index = self.size() - 1
-                self.headers_data[listbox_index] = (i, title)
-            elif line.startswith("###"):
-                title = line[4:]
-                self.insert(tk.END, f"    {title}")
-                listbox_index = self.size() - 1
-                self.headers_data[listbox_index] = (i, title)
-            elif line.startswith("##"):
-                title = line[3:]
-                self.insert(tk.END, f"  {title}")
-                listbox_index = self.size() - 1
-                self.headers_data[listbox_index] = (i, title)
-
-        # восстанавливаем выделение по индексу
-        if selected_index is not None and selected_index < self.size():
-            self.selection_set(selected_index)
-            self.activate(selected_index)
-
-        # --- восстановить скролл ---
-        self.yview_moveto(scroll_pos)
-
-        if selected_index is not None:
-            self.see(selected_index)
+    def _see_row(self, index):
+        """Прокручивает список так, чтобы видимая строка index была на экране"""
+        top = self.canvasy(0)
+        height = self.winfo_height()
+        total = self.row_count() * self.row_height
+        y = index * self.row_height
+        if y < top:
+            self.yview_moveto(y / total)
+        elif y + self.row_height > top + height:
+            self.yview_moveto(max(y + self.row_height - height, 0) / total)
 
     def on_select(self, *args):
         if not self.text_widget:
             return
 
-        selection = self.curselection()
-        if not selection:
+        if self.selected_row is None or self.selected_row >= len(self.headings):
             return
+        text_line_number, _ = self.headings.entry_at(self.selected_row)
 
-        # Получаем номер строки из сохранённой карты
-        listbox_index = selection[0]
-        text_line_number, title = self.headers_data.get(listbox_index, (None, None))
+        # Переходим к нужной строке
+        self.text_widget.mark_set("insert", f"{text_line_number}.0")
+        self.text_widget.see(f"{text_line_number}.0")
 
-        if text_line_number is not None:
-            # Переходим к нужной строке
-            self.text_widget.mark_set("insert", f"{text_line_number}.0")
-            self.text_widget.see(f"{text_line_number}.0")
+    def focus_text(self):
+        if self.text_widget:
             self.text_widget.focus_set()
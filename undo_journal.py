@@ -0,0 +1,153 @@
+from collections import deque
+from contextlib import contextmanager
+
+# Примерные накладные расходы на одну запись сверх самого текста
+RECORD_OVERHEAD = 64
+
+
+def _split_index(index):
+    line, col = index.split(".")
+    return int(line), int(col)
+
+
+def _record_size(removed, inserted):
+    text_size = len(removed.encode("utf-8")) + len(inserted.encode("utf-8"))
+    return text_size + RECORD_OVERHEAD
+
+
+class UndoJournal:
+    """Журнал отмены из компактных записей (index, removed, inserted)
+
+    index — позиция "строка.столбец" начала правки до её применения.
+    Записи группируются в шаги: новый шаг начинается при смене вида правки
+    (вставка/удаление), после separator() и для каждой замены. Объём
+    журнала ограничен бюджетом в байтах, старые шаги вытесняются первыми.
+    """
+
+    def __init__(self, byte_budget=64 * 1024 * 1024):
+        self.byte_budget = byte_budget
+        self.size = 0
+        self._undo = deque()
+        self._redo = []
+        self._step_open = False
+        self._step_kind = None
+        self._group_depth = 0
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def reset(self):
+        self._undo.clear()
+        self._redo.clear()
+        self.size = 0
+        self.separator()
+
+    def separator(self):
+        if not self._group_depth:
+            self._step_open = False
+
+    @contextmanager
+    def group(self):
+        """Все правки внутри блока отменяются одним шагом"""
+        self.separator()
+        self._group_depth += 1
+        try:
+            yield
+        finally:
+            self._group_depth -= 1
+            self.separator()
+
+    def record(self, index, removed, inserted):
+        if not removed and not inserted:
+            return
+
+        for step in self._redo:
+            self.size -= self._step_size(step)
+        self._redo.clear()
+
+        if inserted and removed:
+            kind = "replace"
+        else:
+            kind = "insert" if inserted else "delete"
+
+        same_step = self._step_open and self._undo
+        if not self._group_depth:
+            same_step = same_step and kind == self._step_kind and kind != "replace"
+
+        if same_step:
+            step = self._undo[-1]
+            if self._merge(step, index, removed, inserted):
+                self._trim()
+                return
+        else:
+            step = []
+            self._undo.append(step)
+            self._step_open = True
+            self._step_kind = kind
+
+        step.append((index, removed, inserted))
+        self.size += _record_size(removed, inserted)
+        self._trim()
+
+    def _merge(self, step, index, removed, inserted):
+        """Склеивает посимвольный ввод и удаление в одну запись"""
+        if not step or "\n" in removed or "\n" in inserted:
+            return False
+        last_index, last_removed, last_inserted = step[-1]
+        if "\n" in last_removed or "\n" in last_inserted:
+            return False
+
+        line, col = _split_index(index)
+        last_line, last_col = _split_index(last_index)
+        if line != last_line:
+            return False
+
+        if inserted and not removed and last_inserted and not last_removed:
+            # Продолжение ввода
+            if col != last_col + len(last_inserted):
+                return False
+            merged = (last_index, "", last_inserted + inserted)
+        elif removed and not inserted and last_removed and not last_inserted:
+            if col + len(removed) == last_col:
+                # Backspace
+                merged = (index, removed + last_removed, "")
+            elif col == last_col:
+                # Delete
+                merged = (last_index, last_removed + removed, "")
+            else:
+                return False
+        else:
+            return False
+
+        step[-1] = merged
+        self.size += _record_size(removed, inserted) - RECORD_OVERHEAD
+        return True
+
+    def _step_size(self, step):
+        return sum(_record_size(removed, inserted) for _, removed, inserted in step)
+
+    def _trim(self):
+        # Текущий шаг не вытесняем, даже если он один больше бюджета
+        while self.size > self.byte_budget and len(self._undo) > 1:
+            self.size -= self._step_size(self._undo.popleft())
+
+    def pop_undo(self):
+        """Возвращает последний шаг для отмены и переносит его в redo"""
+        self.separator()
+        if not self._undo:
+            return None
+        step = self._undo.pop()
+        self._redo.append(step)
+        return step
+
+    def pop_redo(self):
+        """Возвращает шаг для повтора и переносит его обратно в undo"""
+        self.separator()
+        if not self._redo:
+            return None
+        step = self._redo.pop()
+        self._undo.append(step)
+        return step